@@ -5,16 +5,23 @@ A comprehensive, object-oriented bikeshare data analyzer with enhanced features,
 better error handling, and improved performance.
 """
 
+import argparse
 import time
 import pandas as pd
 import numpy as np
 from typing import Dict, Tuple, Optional, List
 from pathlib import Path
 import logging
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import date, datetime
 import warnings
 
+from bikeshare_kernels import bucket_stats, count_mode, label_counts, top_k
+from bikeshare_results import ResultCache
+from bikeshare_sketches import HeavyHitters, QuantileSketch
+from bikeshare_storage import (CSV_CHUNK_ROWS, dataset_version, ensure_city_store, ensure_features, iter_csv_chunks,
+                               load_city_data, route_keys)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -22,6 +29,16 @@ logger = logging.getLogger(__name__)
 # Suppress pandas warnings for cleaner output
 warnings.filterwarnings('ignore')
 
+# Trip duration quantiles in the report (median and 95th percentile)
+DURATION_QUANTILES = (0.5, 0.95)
+
+# Inclusive (lower, upper) bounds of the duration buckets in seconds:
+# short (≤10 min), medium (10-30 min) and long (>30 min)
+DURATION_BUCKETS = (np.array([-np.inf, 601, np.nextafter(1800, np.inf)]), np.array([600, 1800, np.inf]))
+
+# Inclusive (lower, upper) bounds of the age groups: young (≤25), adult (26-45), senior (>45)
+AGE_GROUPS = (np.array([-np.inf, 26, np.nextafter(45, np.inf)]), np.array([25, 45, np.inf]))
+
 
 @dataclass
 class FilterConfig:
@@ -29,6 +46,8 @@ class FilterConfig:
     city: str
     month: str
     day: str
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
     
     def __post_init__(self):
         """Validate filter parameters after initialization."""
@@ -37,6 +56,163 @@ class FilterConfig:
         self.day = self.day.lower().strip()
 
 
+def _accumulate(total: Optional[pd.Series], counts: pd.Series) -> pd.Series:
+    """Add a chunk's value counts into a running count series."""
+    if total is None:
+        return counts.astype('int64')
+    return total.add(counts, fill_value=0).astype('int64')
+
+
+def _date_counts(date_codes: np.ndarray) -> pd.Series:
+    """Count trips per calendar date from integer date codes."""
+    first = int(date_codes.min())
+    counts = np.bincount(date_codes - first)
+    days = np.flatnonzero(counts)
+    return pd.Series(counts[days], index=pd.to_datetime(days + first, unit='D'))
+
+
+def _route_counts(chunk: pd.DataFrame) -> pd.Series:
+    """Count trips per (start, end) station pair, on packed route keys when the stations are coded."""
+    start_col, end_col = BikeShareAnalyzer.COL_START_STATION, BikeShareAnalyzer.COL_END_STATION
+    start_dtype = chunk[start_col].dtype
+    if not isinstance(start_dtype, pd.CategoricalDtype) or chunk[end_col].dtype != start_dtype:
+        return chunk.groupby([start_col, end_col]).size()
+    
+    n_stations = len(start_dtype.categories)
+    keys = route_keys(chunk)
+    route_ids, counts = np.unique(keys[keys >= 0], return_counts=True)
+    index = pd.MultiIndex.from_arrays([
+        pd.Categorical.from_codes(route_ids // n_stations, dtype=start_dtype),
+        pd.Categorical.from_codes(route_ids % n_stations, dtype=start_dtype),
+    ])
+    return pd.Series(counts, index=index)
+
+
+@dataclass
+class ReportAggregates:
+    """
+    Everything the analysis report prints, gathered in a few vectorized passes.
+    
+    Every count is keyed by a small domain (hours, days, dates, stations,
+    routes, user types), so memory depends on the number of stations rather
+    than the number of trips. A loaded frame is aggregated in one update()
+    (see from_frame); streaming mode folds in one chunk at a time.
+    """
+    total_trips: int = 0
+    first_start: Optional[pd.Timestamp] = None
+    last_start: Optional[pd.Timestamp] = None
+    month_counts: np.ndarray = field(default_factory=lambda: np.zeros(13, dtype=np.int64))
+    day_counts: np.ndarray = field(default_factory=lambda: np.zeros(7, dtype=np.int64))
+    hour_counts: np.ndarray = field(default_factory=lambda: np.zeros(24, dtype=np.int64))
+    date_counts: Optional[pd.Series] = None
+    start_station_counts: Optional[pd.Series] = None
+    end_station_counts: Optional[pd.Series] = None
+    route_counts: Optional[pd.Series] = None
+    route_hitters: Optional[HeavyHitters] = None  # Replaces route_counts with a fixed counter budget
+    duration_count: int = 0
+    duration_sum: float = 0.0
+    duration_min: float = np.inf
+    duration_max: float = -np.inf
+    duration_quantiles: Optional[np.ndarray] = None  # Exact; only known when aggregating a whole frame at once
+    duration_sketch: QuantileSketch = field(default_factory=QuantileSketch)
+    short_trips: int = 0
+    medium_trips: int = 0
+    long_trips: int = 0
+    user_type_counts: Optional[pd.Series] = None
+    gender_counts: Optional[pd.Series] = None
+    birth_year_counts: Optional[pd.Series] = None
+    frame_bytes: int = 0  # Memory of the aggregated frame (0 when streamed)
+    
+    @classmethod
+    def create(cls, route_counters: Optional[int] = None) -> 'ReportAggregates':
+        """Return empty aggregates, tracking routes in `route_counters` counters if given (else exactly)."""
+        return cls(route_hitters=HeavyHitters(route_counters) if route_counters else None)
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, route_counters: Optional[int] = None) -> 'ReportAggregates':
+        """Aggregate a loaded frame, including exact trip duration quantiles."""
+        aggregates = cls.create(route_counters)
+        aggregates.update(df, exact_quantiles=True)
+        aggregates.frame_bytes = int(df.memory_usage(deep=True).sum())
+        return aggregates
+    
+    def update(self, chunk: pd.DataFrame, exact_quantiles: bool = False) -> None:
+        """
+        Fold one parsed chunk into the running aggregates.
+        
+        Args:
+            chunk: Preprocessed trips
+            exact_quantiles: Record the chunk's exact trip duration quantiles
+                (only meaningful when the chunk is the whole data set);
+                otherwise the chunk is sketched and merged
+        """
+        if len(chunk) == 0:
+            return
+        
+        start_times = chunk[BikeShareAnalyzer.COL_START_TIME]
+        self.total_trips += len(chunk)
+        chunk_first, chunk_last = start_times.min(), start_times.max()
+        self.first_start = chunk_first if self.first_start is None else min(self.first_start, chunk_first)
+        self.last_start = chunk_last if self.last_start is None else max(self.last_start, chunk_last)
+        
+        # Time patterns: counts over the stored integer codes
+        ensure_features(chunk, ['date_code', 'month', 'day_of_week', 'hour'])
+        self.month_counts += np.bincount(chunk['month'], minlength=13)
+        self.day_counts += np.bincount(chunk['day_of_week'], minlength=7)
+        self.hour_counts += np.bincount(chunk['hour'], minlength=24)
+        self.date_counts = _accumulate(self.date_counts, _date_counts(chunk['date_code'].to_numpy()))
+        
+        # Stations and routes
+        start_col, end_col = BikeShareAnalyzer.COL_START_STATION, BikeShareAnalyzer.COL_END_STATION
+        if start_col in chunk.columns:
+            self.start_station_counts = _accumulate(self.start_station_counts, label_counts(chunk[start_col]))
+        if end_col in chunk.columns:
+            self.end_station_counts = _accumulate(self.end_station_counts, label_counts(chunk[end_col]))
+        if start_col in chunk.columns and end_col in chunk.columns:
+            if self.route_hitters is None:
+                self.route_counts = _accumulate(self.route_counts, _route_counts(chunk))
+            else:
+                # Count routes a block at a time so no table ever holds more
+                # than a block's distinct pairs plus the counter budget
+                stations = chunk[[start_col, end_col]]
+                for block in range(0, len(stations), CSV_CHUNK_ROWS):
+                    self.route_hitters.update(_route_counts(stations.iloc[block:block + CSV_CHUNK_ROWS]))
+        
+        # Trip duration: the buckets, count, sum and extremes come from one
+        # compiled loop (see bucket_stats)
+        if BikeShareAnalyzer.COL_TRIP_DURATION in chunk.columns:
+            durations = chunk[BikeShareAnalyzer.COL_TRIP_DURATION].to_numpy(dtype=np.float64, na_value=np.nan)
+            stats = bucket_stats(durations, *DURATION_BUCKETS)
+            if stats.count:
+                self.duration_count += stats.count
+                self.duration_sum += stats.total
+                self.duration_min = min(self.duration_min, stats.minimum)
+                self.duration_max = max(self.duration_max, stats.maximum)
+                short_trips, medium_trips, long_trips = stats.counts
+                self.short_trips += int(short_trips)
+                self.medium_trips += int(medium_trips)
+                self.long_trips += int(long_trips)
+                if exact_quantiles:
+                    known = durations[~np.isnan(durations)] if stats.missing else durations
+                    self.duration_quantiles = np.quantile(known, DURATION_QUANTILES)
+                else:
+                    self.duration_sketch.merge(QuantileSketch().update(durations))
+        
+        # Demographics
+        if BikeShareAnalyzer.COL_USER_TYPE in chunk.columns:
+            self.user_type_counts = _accumulate(self.user_type_counts, label_counts(chunk[BikeShareAnalyzer.COL_USER_TYPE]))
+        if BikeShareAnalyzer.COL_GENDER in chunk.columns:
+            self.gender_counts = _accumulate(self.gender_counts, label_counts(chunk[BikeShareAnalyzer.COL_GENDER]))
+        if BikeShareAnalyzer.COL_BIRTH_YEAR in chunk.columns:
+            self.birth_year_counts = _accumulate(self.birth_year_counts, label_counts(chunk[BikeShareAnalyzer.COL_BIRTH_YEAR]))
+    
+    def duration_percentiles(self) -> Tuple[np.ndarray, float]:
+        """Return the DURATION_QUANTILES of trip duration and their rank error (0 when exact)."""
+        if self.duration_quantiles is not None:
+            return self.duration_quantiles, 0.0
+        return self.duration_sketch.quantiles(DURATION_QUANTILES), self.duration_sketch.rank_error
+
+
 class BikeShareAnalyzer:
     """
     Enhanced Bikeshare Data Analyzer with improved OOP design and advanced analytics.
@@ -48,7 +224,8 @@ class BikeShareAnalyzer:
         'washington': 'washington.csv'
     }
     
-    MONTHS = ['all', 'january', 'february', 'march', 'april', 'may', 'june']
+    MONTHS = ['all', 'january', 'february', 'march', 'april', 'may', 'june',
+              'july', 'august', 'september', 'october', 'november', 'december']
     DAYS = ['all', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
     
     # Column name constants
@@ -60,11 +237,31 @@ class BikeShareAnalyzer:
     COL_GENDER = 'Gender'
     COL_BIRTH_YEAR = 'Birth Year'
     
-    def __init__(self, data_directory: str = "."):
-        """Initialize the analyzer with data directory path."""
+    def __init__(self, data_directory: str = ".", streaming: bool = False,
+                 chunk_rows: int = CSV_CHUNK_ROWS, start_date: Optional[date] = None,
+                 end_date: Optional[date] = None, route_counters: Optional[int] = None):
+        """
+        Initialize the analyzer with data directory path.
+        
+        Args:
+            data_directory: Directory holding the city CSV files
+            streaming: Analyze in a single bounded-memory pass instead of loading the full frame
+            chunk_rows: Rows read per chunk in streaming mode
+            start_date: First date to analyze (None for no lower bound)
+            end_date: Last date to analyze, inclusive (None for no upper bound)
+            route_counters: Track the most popular routes approximately in this
+                many counters (None to count every route exactly)
+        """
         self.data_dir = Path(data_directory)
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        self.start_date = start_date
+        self.end_date = end_date
+        self.route_counters = route_counters
         self.df: Optional[pd.DataFrame] = None
         self.filters: Optional[FilterConfig] = None
+        # Aggregates of filters already analyzed, reused while the data file is unchanged
+        self.results = ResultCache()
         
     def validate_data_files(self) -> bool:
         """Validate that all required data files exist."""
@@ -122,10 +319,12 @@ class BikeShareAnalyzer:
             allow_numbers=True
         )
         
-        filters = FilterConfig(city, month, day)
+        filters = FilterConfig(city, month, day, self.start_date, self.end_date)
         self.filters = filters
         
         print(f"\n✅ Selected filters: {filters.city.title()}, {filters.month.title()}, {filters.day.title()}")
+        if filters.start_date or filters.end_date:
+            print(f"🗓️  Date range: {self._date_range_label(filters)}")
         print("-" * 60)
         
         return filters
@@ -158,6 +357,17 @@ class BikeShareAnalyzer:
                 logger.error(f"Input error: {e}")
                 print("❌ Invalid input. Please try again.")
     
+    @staticmethod
+    def _date_range_label(filters: FilterConfig) -> str:
+        """Describe the custom date range of a filter configuration."""
+        return f"{filters.start_date or 'start'} to {filters.end_date or 'end'}"
+    
+    def _filter_values(self, filters: FilterConfig) -> Tuple[Optional[int], Optional[str]]:
+        """Translate a filter configuration into a month number and day name (None for 'all')."""
+        month_num = self.MONTHS.index(filters.month) if filters.month != 'all' else None  # 1-based for months
+        day_name = filters.day.title() if filters.day != 'all' else None
+        return month_num, day_name
+    
     def load_and_filter_data(self, filters: FilterConfig) -> pd.DataFrame:
         """
         Load and filter data with enhanced error handling and performance optimization.
@@ -173,34 +383,12 @@ class BikeShareAnalyzer:
             print(f"📊 Loading data for {filters.city.title()}...")
             start_time = time.time()
             
-            # Load data with optimized dtypes
+            # Push the filters down into the loader so only the matching row
+            # ranges of the time-sorted, memory-mapped column store are read
+            month_num, day_name = self._filter_values(filters)
             file_path = self.data_dir / self.CITY_DATA[filters.city]
-            
-            # Load data first, then optimize data types for better performance
-            df = pd.read_csv(file_path)
-            
-            # Convert to categorical data types if columns exist
-            for col in [self.COL_START_STATION, self.COL_END_STATION, self.COL_USER_TYPE]:
-                if col in df.columns:
-                    df[col] = df[col].astype('category')
-            
-            # Convert datetime with better error handling
-            df[self.COL_START_TIME] = pd.to_datetime(df[self.COL_START_TIME], errors='coerce')
-            df = df.dropna(subset=[self.COL_START_TIME])  # Remove invalid dates
-            
-            # Create additional time-based features
-            df['month'] = df[self.COL_START_TIME].dt.month
-            df['day_of_week'] = df[self.COL_START_TIME].dt.day_name()
-            df['hour'] = df[self.COL_START_TIME].dt.hour
-            df['date'] = df[self.COL_START_TIME].dt.date
-            
-            # Apply filters efficiently
-            if filters.month != 'all':
-                month_num = self.MONTHS.index(filters.month)  # 0-based for 'all', 1-based for months
-                df = df[df['month'] == month_num]
-            
-            if filters.day != 'all':
-                df = df[df['day_of_week'] == filters.day.title()]
+            df = load_city_data(file_path, month=month_num, day=day_name,
+                                start_date=filters.start_date, end_date=filters.end_date)
             
             load_time = time.time() - start_time
             print(f"✅ Loaded {len(df):,} records in {load_time:.2f} seconds")
@@ -219,239 +407,255 @@ class BikeShareAnalyzer:
             logger.error(f"Error loading data: {e}")
             raise
     
-    def analyze_time_patterns(self) -> None:
-        """Enhanced time pattern analysis with additional insights."""
-        if self.df is None or len(self.df) == 0:
-            return
+    def stream_aggregates(self, filters: FilterConfig) -> ReportAggregates:
+        """
+        Aggregate a city file in a single chunked pass without holding the full frame.
+        
+        Args:
+            filters: Filter configuration
             
+        Returns:
+            ReportAggregates: Aggregates for every report section
+        """
+        print(f"📊 Streaming data for {filters.city.title()} in chunks of {self.chunk_rows:,} rows...")
+        start_time = time.time()
+        
+        month_num, day_name = self._filter_values(filters)
+        file_path = self.data_dir / self.CITY_DATA[filters.city]
+        
+        aggregates = ReportAggregates.create(self.route_counters)
+        chunks = iter_csv_chunks(file_path, month=month_num, day=day_name, chunk_rows=self.chunk_rows,
+                                 start_date=filters.start_date, end_date=filters.end_date)
+        for chunk in chunks:
+            aggregates.update(chunk)
+        
+        print(f"✅ Aggregated {aggregates.total_trips:,} records in {time.time() - start_time:.2f} seconds")
+        if aggregates.total_trips == 0:
+            print("⚠️  No data found for the selected filters. Please try different options.")
+        return aggregates
+    
+    def compute_aggregates(self, filters: FilterConfig) -> ReportAggregates:
+        """Aggregate the trips matching the filters, streaming or from the loaded frame."""
+        if self.streaming:
+            # Single bounded-memory pass over the city file
+            return self.stream_aggregates(filters)
+        
+        # Load and filter data, then aggregate every report section at once
+        df = self.load_and_filter_data(filters)
+        if len(df) == 0:
+            return ReportAggregates.create(self.route_counters)
+        return ReportAggregates.from_frame(df, self.route_counters)
+    
+    def cached_aggregates(self, filters: FilterConfig) -> ReportAggregates:
+        """
+        Return the aggregates of the filters, reusing an earlier analysis of the same data.
+        
+        Results are keyed by the filters, the analysis options and the data
+        file's version, so editing or appending to the file recomputes them.
+        """
+        file_path = self.data_dir / self.CITY_DATA[filters.city]
+        if not self.streaming:
+            # Build the column store first: its manifest is part of the
+            # version, so a key taken before the first load would never repeat
+            ensure_city_store(file_path)
+        key = (filters.city, dataset_version(file_path), filters.month, filters.day,
+               filters.start_date, filters.end_date, self.streaming, self.route_counters)
+        aggregates = self.results.get(key)
+        if aggregates is not None:
+            print(f"♻️  Reusing the analysis of {filters.city.title()} for these filters (data unchanged)")
+            return aggregates
+        
+        aggregates = self.compute_aggregates(filters)
+        if aggregates.total_trips > 0:
+            self.results.put(key, aggregates)
+        return aggregates
+    
+    def display_report(self, agg: ReportAggregates) -> None:
+        """Print every report section from the report aggregates."""
+        if agg.total_trips == 0:
+            return
+        
+        print('\n📋 DATA SUMMARY')
+        print('=' * 50)
+        print(f"🔢 Total trips analyzed: {agg.total_trips:,}")
+        print(f"📅 Date range: {agg.first_start.date()} to {agg.last_start.date()}")
+        if self.filters:
+            print(f"🏙️  City: {self.filters.city.title()}")
+            print(f"📅 Month filter: {self.filters.month.title()}")
+            print(f"📆 Day filter: {self.filters.day.title()}")
+            if self.filters.start_date or self.filters.end_date:
+                print(f"🗓️  Date filter: {self._date_range_label(self.filters)}")
+        if self.streaming:
+            print(f"💾 Streaming chunk size: {self.chunk_rows:,} rows")
+        elif agg.frame_bytes:
+            print(f"💾 Memory usage: {agg.frame_bytes / 1024**2:.1f} MB")
+        print('-' * 50)
+        
+        self._report_time_patterns(agg)
+        self._report_stations(agg)
+        self._report_trip_duration(agg)
+        self._report_user_demographics(agg)
+        self._report_usage_patterns(agg)
+    
+    def _report_time_patterns(self, agg: ReportAggregates) -> None:
+        """Print the time pattern section from the report aggregates."""
         print('\n⏰ TIME PATTERN ANALYSIS')
         print('=' * 50)
-        start_time = time.time()
         
-        # Most common month
         if self.filters and self.filters.month == 'all':
-            common_month = self.df['month'].mode()[0]
-            month_name = self.MONTHS[common_month] if common_month <= len(self.MONTHS) else 'Unknown'
-            month_count = (self.df['month'] == common_month).sum()
+            common_month, month_count = count_mode(agg.month_counts)
+            month_name = self.MONTHS[common_month] if common_month < len(self.MONTHS) else 'Unknown'
             print(f"📅 Most popular month: {month_name.title()} ({month_count:,} trips)")
         
-        # Most common day
         if self.filters and self.filters.day == 'all':
-            common_day = self.df['day_of_week'].mode()[0]
-            day_count = (self.df['day_of_week'] == common_day).sum()
-            print(f"📆 Most popular day: {common_day} ({day_count:,} trips)")
+            common_day, day_count = count_mode(agg.day_counts)
+            print(f"📆 Most popular day: {self.DAYS[common_day + 1].title()} ({day_count:,} trips)")
         
-        # Peak hours analysis
-        common_hour = self.df['hour'].mode()[0]
-        hour_count = (self.df['hour'] == common_hour).sum()
+        common_hour, hour_count = count_mode(agg.hour_counts)
         hour_12 = f"{common_hour % 12 or 12}{'AM' if common_hour < 12 else 'PM'}"
         print(f"🕐 Peak hour: {common_hour}:00 ({hour_12}) - {hour_count:,} trips")
         
-        # Additional time insights
-        print(f"🌅 Early morning trips (5-9 AM): {len(self.df[self.df['hour'].between(5, 9)]):,}")
-        print(f"🌇 Evening rush trips (5-7 PM): {len(self.df[self.df['hour'].between(17, 19)]):,}")
-        print(f"🌙 Night trips (10 PM-5 AM): {len(self.df[(self.df['hour'] >= 22) | (self.df['hour'] <= 5)]):,}")
-        
-        print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
+        print(f"🌅 Early morning trips (5-9 AM): {agg.hour_counts[5:10].sum():,}")
+        print(f"🌇 Evening rush trips (5-7 PM): {agg.hour_counts[17:20].sum():,}")
+        print(f"🌙 Night trips (10 PM-5 AM): {agg.hour_counts[22:].sum() + agg.hour_counts[:6].sum():,}")
         print('-' * 50)
     
-    def analyze_stations(self) -> None:
-        """Enhanced station analysis with trip patterns."""
-        if self.df is None or len(self.df) == 0:
+    def _report_stations(self, agg: ReportAggregates) -> None:
+        """Print the station section from the report aggregates."""
+        if agg.start_station_counts is None or agg.end_station_counts is None:
             return
-            
+        
         print('\n🚉 STATION POPULARITY ANALYSIS')
         print('=' * 50)
-        start_time = time.time()
         
-        # Most popular start station
-        start_station = self.df[self.COL_START_STATION].mode()[0]
-        start_count = (self.df[self.COL_START_STATION] == start_station).sum()
+        # Both station columns share one dictionary; drop stations never seen on this side
+        start_counts = agg.start_station_counts[agg.start_station_counts > 0].sort_index()
+        end_counts = agg.end_station_counts[agg.end_station_counts > 0].sort_index()
+        start_station, end_station = start_counts.idxmax(), end_counts.idxmax()
         print(f"🚀 Most popular start station: {start_station}")
-        print(f"   └─ {start_count:,} trips started here")
-        
-        # Most popular end station
-        end_station = self.df[self.COL_END_STATION].mode()[0]
-        end_count = (self.df[self.COL_END_STATION] == end_station).sum()
+        print(f"   └─ {start_counts[start_station]:,} trips started here")
         print(f"🏁 Most popular end station: {end_station}")
-        print(f"   └─ {end_count:,} trips ended here")
-        
-        # Most common trip route
-        self.df['route'] = self.df[self.COL_START_STATION].astype(str) + ' → ' + self.df[self.COL_END_STATION].astype(str)
-        common_route = self.df['route'].mode()[0]
-        route_count = (self.df['route'] == common_route).sum()
-        print(f"🛣️  Most popular route: {common_route}")
-        print(f"   └─ {route_count:,} trips on this route")
-        
-        # Additional station insights
-        unique_start = self.df[self.COL_START_STATION].nunique()
-        unique_end = self.df[self.COL_END_STATION].nunique()
-        print(f"📊 Total unique start stations: {unique_start}")
-        print(f"📊 Total unique end stations: {unique_end}")
-        
-        print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
+        print(f"   └─ {end_counts[end_station]:,} trips ended here")
+        
+        if agg.route_hitters is None:
+            route_counts = agg.route_counts.sort_index()
+            route = route_counts.idxmax()
+            print(f"🛣️  Most popular route: {route[0]} → {route[1]}")
+            print(f"   └─ {route_counts[route]:,} trips on this route")
+        else:
+            top = agg.route_hitters.top(1)
+            route, count = top.index[0], top.iloc[0]
+            bound = f" (overcounted by at most {agg.route_hitters.floor:,})" if agg.route_hitters.floor else ""
+            print(f"🛣️  Most popular route: {route[0]} → {route[1]}")
+            print(f"   └─ {count:,} trips on this route{bound}")
+        
+        print(f"📊 Total unique start stations: {len(start_counts)}")
+        print(f"📊 Total unique end stations: {len(end_counts)}")
         print('-' * 50)
     
-    def analyze_trip_duration(self) -> None:
-        """Enhanced trip duration analysis with statistical insights."""
-        if self.df is None or len(self.df) == 0 or self.COL_TRIP_DURATION not in self.df.columns:
+    def _report_trip_duration(self, agg: ReportAggregates) -> None:
+        """Print the trip duration section from the report aggregates."""
+        if agg.duration_count == 0:
             print("\n⚠️  Trip duration data not available")
             return
-            
+        
         print('\n⏱️  TRIP DURATION ANALYSIS')
         print('=' * 50)
-        start_time = time.time()
-        
-        duration_stats = self.df[self.COL_TRIP_DURATION].describe()
-        total_time = self.df[self.COL_TRIP_DURATION].sum()
-        
-        # Convert seconds to readable format
-        def format_duration(seconds):
-            """Convert seconds to human-readable format."""
-            if pd.isna(seconds):
-                return "N/A"
-            hours, remainder = divmod(int(seconds), 3600)
-            minutes, secs = divmod(remainder, 60)
-            if hours > 0:
-                return f"{hours}h {minutes}m {secs}s"
-            elif minutes > 0:
-                return f"{minutes}m {secs}s"
-            else:
-                return f"{secs}s"
-        
-        print(f"📊 Total travel time: {format_duration(total_time)} ({total_time:,.0f} seconds)")
-        print(f"📊 Average trip duration: {format_duration(duration_stats['mean'])}")
-        print(f"📊 Median trip duration: {format_duration(duration_stats['50%'])}")
-        print(f"📊 Shortest trip: {format_duration(duration_stats['min'])}")
-        print(f"📊 Longest trip: {format_duration(duration_stats['max'])}")
-        
-        # Trip duration categories
-        short_trips = len(self.df[self.df[self.COL_TRIP_DURATION] <= 600])  # ≤ 10 minutes
-        medium_trips = len(self.df[self.df[self.COL_TRIP_DURATION].between(601, 1800)])  # 10-30 minutes
-        long_trips = len(self.df[self.df[self.COL_TRIP_DURATION] > 1800])  # > 30 minutes
         
-        print(f"🚴 Short trips (≤10 min): {short_trips:,} ({short_trips/len(self.df)*100:.1f}%)")
-        print(f"🚴 Medium trips (10-30 min): {medium_trips:,} ({medium_trips/len(self.df)*100:.1f}%)")
-        print(f"🚴 Long trips (>30 min): {long_trips:,} ({long_trips/len(self.df)*100:.1f}%)")
-        
-        print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
+        fmt = self._format_duration
+        print(f"📊 Total travel time: {fmt(agg.duration_sum)} ({agg.duration_sum:,.0f} seconds)")
+        print(f"📊 Average trip duration: {fmt(agg.duration_sum / agg.duration_count)}")
+        (median, p95), rank_error = agg.duration_percentiles()
+        approx = f" (±{rank_error:.1%} rank, streaming sketch)" if rank_error else ""
+        print(f"📊 Median trip duration: {fmt(median)}{approx}")
+        print(f"📊 95th percentile trip duration: {fmt(p95)}{approx}")
+        print(f"📊 Shortest trip: {fmt(agg.duration_min)}")
+        print(f"📊 Longest trip: {fmt(agg.duration_max)}")
+        
+        total = agg.total_trips
+        print(f"🚴 Short trips (≤10 min): {agg.short_trips:,} ({agg.short_trips/total*100:.1f}%)")
+        print(f"🚴 Medium trips (10-30 min): {agg.medium_trips:,} ({agg.medium_trips/total*100:.1f}%)")
+        print(f"🚴 Long trips (>30 min): {agg.long_trips:,} ({agg.long_trips/total*100:.1f}%)")
         print('-' * 50)
     
-    def analyze_user_demographics(self) -> None:
-        """Enhanced user demographic analysis."""
-        if self.df is None or len(self.df) == 0:
-            return
-            
+    def _report_user_demographics(self, agg: ReportAggregates) -> None:
+        """Print the demographics section from the report aggregates."""
         print('\n👥 USER DEMOGRAPHICS ANALYSIS')
         print('=' * 50)
-        start_time = time.time()
         
-        # User type analysis
-        if self.COL_USER_TYPE in self.df.columns:
-            user_types = self.df[self.COL_USER_TYPE].value_counts()
+        if agg.user_type_counts is not None:
             print("📋 User Type Distribution:")
-            for user_type, count in user_types.items():
-                percentage = count / len(self.df) * 100
-                print(f"   {user_type}: {count:,} ({percentage:.1f}%)")
+            for user_type, count in agg.user_type_counts.sort_values(ascending=False, kind='stable').items():
+                print(f"   {user_type}: {count:,} ({count / agg.total_trips * 100:.1f}%)")
         
-        # Gender analysis
-        if self.COL_GENDER in self.df.columns:
-            gender_counts = self.df[self.COL_GENDER].value_counts()
+        if agg.gender_counts is not None:
             print("\n⚥ Gender Distribution:")
-            for gender, count in gender_counts.items():
-                percentage = count / len(self.df) * 100
-                print(f"   {gender}: {count:,} ({percentage:.1f}%)")
+            for gender, count in agg.gender_counts.sort_values(ascending=False, kind='stable').items():
+                print(f"   {gender}: {count:,} ({count / agg.total_trips * 100:.1f}%)")
         else:
             print("\n⚠️  Gender data not available for this city")
         
-        # Birth year analysis
-        if self.COL_BIRTH_YEAR in self.df.columns:
-            birth_years = self.df[self.COL_BIRTH_YEAR].dropna()
-            if not birth_years.empty:
+        if agg.birth_year_counts is not None:
+            year_counts = agg.birth_year_counts.sort_index()
+            if not year_counts.empty:
+                n_years = year_counts.sum()
+                mean_year = (year_counts.index.to_numpy() * year_counts.to_numpy()).sum() / n_years
                 print("\n🎂 Birth Year Statistics:")
-                print(f"   Earliest: {int(birth_years.min())}")
-                print(f"   Most recent: {int(birth_years.max())}")
-                print(f"   Most common: {int(birth_years.mode()[0])}")
-                print(f"   Average age (approx): {2024 - birth_years.mean():.0f} years")
+                print(f"   Earliest: {int(year_counts.index.min())}")
+                print(f"   Most recent: {int(year_counts.index.max())}")
+                print(f"   Most common: {int(year_counts.idxmax())}")
+                print(f"   Average age (approx): {2024 - mean_year:.0f} years")
                 
-                # Age groups
-                current_year = datetime.now().year
-                ages = current_year - birth_years
-                
-                young = len(ages[ages <= 25])
-                adult = len(ages[ages.between(26, 45)])
-                senior = len(ages[ages > 45])
-                
-                print(f"   Young (≤25): {young:,} ({young/len(birth_years)*100:.1f}%)")
-                print(f"   Adult (26-45): {adult:,} ({adult/len(birth_years)*100:.1f}%)")
-                print(f"   Senior (>45): {senior:,} ({senior/len(birth_years)*100:.1f}%)")
+                # Age groups are weighted by trips per birth year, so the
+                # trips are never expanded into an array of ages
+                ages = datetime.now().year - year_counts.index.to_numpy(dtype=np.float64)
+                young, adult, senior = bucket_stats(ages, *AGE_GROUPS, weights=year_counts.to_numpy()).counts
+                print(f"   Young (≤25): {young:,} ({young/n_years*100:.1f}%)")
+                print(f"   Adult (26-45): {adult:,} ({adult/n_years*100:.1f}%)")
+                print(f"   Senior (>45): {senior:,} ({senior/n_years*100:.1f}%)")
         else:
             print("\n⚠️  Birth year data not available for this city")
-        
-        print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
         print('-' * 50)
     
-    def analyze_usage_patterns(self) -> None:
-        """New advanced analysis for usage patterns and trends."""
-        if self.df is None or len(self.df) == 0:
-            return
-            
+    def _report_usage_patterns(self, agg: ReportAggregates) -> None:
+        """Print the usage pattern section from the report aggregates."""
         print('\n📈 ADVANCED USAGE PATTERN ANALYSIS')
         print('=' * 50)
-        start_time = time.time()
         
-        # Daily patterns
-        daily_usage = self.df.groupby('date').size()
+        daily_usage = agg.date_counts.sort_index()
         print(f"📊 Average daily trips: {daily_usage.mean():.0f}")
-        print(f"📊 Busiest day: {daily_usage.idxmax()} ({daily_usage.max():,} trips)")
-        print(f"📊 Quietest day: {daily_usage.idxmin()} ({daily_usage.min():,} trips)")
+        print(f"📊 Busiest day: {daily_usage.idxmax().date()} ({daily_usage.max():,} trips)")
+        print(f"📊 Quietest day: {daily_usage.idxmin().date()} ({daily_usage.min():,} trips)")
         
-        # Hourly distribution
-        hourly_usage = self.df.groupby('hour').size()
-        peak_hours = hourly_usage.nlargest(3).index.tolist()
+        peak_hours = [hour for hour in top_k(agg.hour_counts, 3) if agg.hour_counts[hour] > 0]
         print(f"📊 Top 3 peak hours: {', '.join([f'{h}:00' for h in peak_hours])}")
         
-        # Weekend vs Weekday
-        self.df['is_weekend'] = self.df['day_of_week'].isin(['Saturday', 'Sunday'])
-        weekend_trips = self.df[self.df['is_weekend']].shape[0]
-        weekday_trips = self.df[~self.df['is_weekend']].shape[0]
-        
+        weekend_trips = int(agg.day_counts[5:].sum())
+        weekday_trips = int(agg.day_counts[:5].sum())
         if weekend_trips > 0 and weekday_trips > 0:
-            print(f"📊 Weekend trips: {weekend_trips:,} ({weekend_trips/len(self.df)*100:.1f}%)")
-            print(f"📊 Weekday trips: {weekday_trips:,} ({weekday_trips/len(self.df)*100:.1f}%)")
-        
-        # Station efficiency (trips per station)
-        if self.COL_START_STATION in self.df.columns:
-            station_efficiency = self.df.groupby(self.COL_START_STATION).size()
-            avg_trips_per_station = station_efficiency.mean()
-            print(f"📊 Average trips per station: {avg_trips_per_station:.1f}")
-            
-            # Most and least active stations
-            most_active = station_efficiency.idxmax()
-            least_active = station_efficiency.idxmin()
-            print(f"📊 Most active station: {most_active} ({station_efficiency.max():,} trips)")
-            print(f"📊 Least active station: {least_active} ({station_efficiency.min():,} trips)")
-        
-        print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
+            print(f"📊 Weekend trips: {weekend_trips:,} ({weekend_trips/agg.total_trips*100:.1f}%)")
+            print(f"📊 Weekday trips: {weekday_trips:,} ({weekday_trips/agg.total_trips*100:.1f}%)")
+        
+        if agg.start_station_counts is not None:
+            station_counts = agg.start_station_counts[agg.start_station_counts > 0].sort_index()
+            print(f"📊 Average trips per station: {station_counts.mean():.1f}")
+            print(f"📊 Most active station: {station_counts.idxmax()} ({station_counts.max():,} trips)")
+            print(f"📊 Least active station: {station_counts.idxmin()} ({station_counts.min():,} trips)")
         print('-' * 50)
     
-    def display_summary_stats(self) -> None:
-        """Display comprehensive summary statistics."""
-        if self.df is None or len(self.df) == 0:
-            return
-            
-        print('\n📋 DATA SUMMARY')
-        print('=' * 50)
-        
-        print(f"🔢 Total trips analyzed: {len(self.df):,}")
-        print(f"📅 Date range: {self.df[self.COL_START_TIME].min().date()} to {self.df[self.COL_START_TIME].max().date()}")
-        if self.filters:
-            print(f"🏙️  City: {self.filters.city.title()}")
-            print(f"📅 Month filter: {self.filters.month.title()}")
-            print(f"📆 Day filter: {self.filters.day.title()}")
-        print(f"💾 Memory usage: {self.df.memory_usage(deep=True).sum() / 1024**2:.1f} MB")
-        
-        print('-' * 50)
+    @staticmethod
+    def _format_duration(seconds) -> str:
+        """Convert seconds to human-readable format."""
+        if pd.isna(seconds):
+            return "N/A"
+        hours, remainder = divmod(int(seconds), 3600)
+        minutes, secs = divmod(remainder, 60)
+        if hours > 0:
+            return f"{hours}h {minutes}m {secs}s"
+        elif minutes > 0:
+            return f"{minutes}m {secs}s"
+        else:
+            return f"{secs}s"
     
     def run_analysis(self) -> None:
         """Run the complete analysis workflow."""
@@ -465,19 +669,14 @@ class BikeShareAnalyzer:
                 # Get user preferences
                 filters = self.get_user_filters()
                 
-                # Load and filter data
-                df = self.load_and_filter_data(filters)
-                
-                if len(df) == 0:
+                start_time = time.time()
+                aggregates = self.cached_aggregates(filters)
+                if aggregates.total_trips == 0:
                     continue
                 
-                # Run all analyses
-                self.display_summary_stats()
-                self.analyze_time_patterns()
-                self.analyze_stations()
-                self.analyze_trip_duration()
-                self.analyze_user_demographics()
-                self.analyze_usage_patterns()
+                self.display_report(aggregates)
+                if not self.streaming:
+                    print(f"\n⚡ Analysis completed in {time.time() - start_time:.3f} seconds")
                 
                 # Ask if user wants to continue
                 print('\n' + '=' * 60)
@@ -501,7 +700,24 @@ class BikeShareAnalyzer:
 
 def main():
     """Main function to run the bikeshare analyzer."""
-    analyzer = BikeShareAnalyzer()
+    parser = argparse.ArgumentParser(description="Advanced Bikeshare Data Analysis Tool")
+    parser.add_argument('--data-dir', default='.', help="Directory containing the city CSV files")
+    parser.add_argument('--stream', action='store_true',
+                        help="Analyze in a single bounded-memory pass over the CSV")
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS,
+                        help="Rows read per chunk in streaming mode")
+    parser.add_argument('--start-date', type=date.fromisoformat,
+                        help="Only analyze trips on or after this date (YYYY-MM-DD)")
+    parser.add_argument('--end-date', type=date.fromisoformat,
+                        help="Only analyze trips on or before this date (YYYY-MM-DD)")
+    parser.add_argument('--route-counters', type=int,
+                        help="Track the most popular routes in this many counters (approximate, "
+                             "bounded memory) instead of counting every route")
+    args = parser.parse_args()
+    
+    analyzer = BikeShareAnalyzer(args.data_dir, streaming=args.stream, chunk_rows=args.chunk_rows,
+                                 start_date=args.start_date, end_date=args.end_date,
+                                 route_counters=args.route_counters)
     analyzer.run_analysis()
 
 
@@ -0,0 +1,155 @@
+"""
+Bikeshare Performance Benchmarks
+================================
+Micro-benchmarks for the hot paths of the data loaders and dashboards.
+
+Run with: python bikeshare_benchmark.py [--file chicago.csv] [--rows 1000000]
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from bikeshare_kernels import count_matrix
+from bikeshare_storage import COL_START_TIME, COL_USER_TYPE, TIMESTAMP_FORMAT, parse_timestamps
+
+
+def _time_call(func: Callable[[], object], repeats: int) -> float:
+    """Return the best wall-clock time of several runs of func."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_timestamps(n_rows: int, seed: int = 0) -> pd.Series:
+    """Generate timestamp strings in the city export format, with a few malformed rows."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2017-01-01').value // 10**9
+    end = pd.Timestamp('2017-07-01').value // 10**9
+    seconds = rng.integers(start, end, n_rows)
+    values = pd.Series(pd.to_datetime(seconds, unit='s').strftime(TIMESTAMP_FORMAT))
+    
+    # Sprinkle in rows the fixed format rejects, as seen in real exports
+    bad = rng.choice(n_rows, size=max(1, n_rows // 10_000), replace=False)
+    values.iloc[bad] = 'not a timestamp'
+    return values
+
+
+def benchmark_timestamp_parsing(values: pd.Series, repeats: int = 3) -> Dict[str, float]:
+    """
+    Compare parse throughput of the inferred-format call and the fixed-format parser.
+    
+    Args:
+        values: Timestamp strings to parse
+        repeats: Number of runs per parser (best time is kept)
+        
+    Returns:
+        Dict[str, float]: Rows per second for each parser
+    """
+    inferred = _time_call(lambda: pd.to_datetime(values, errors='coerce'), repeats)
+    fixed = _time_call(lambda: parse_timestamps(values), repeats)
+    return {
+        'pd.to_datetime(errors=coerce)': len(values) / inferred,
+        'parse_timestamps': len(values) / fixed,
+    }
+
+
+def trip_frame(values: pd.Series, seed: int = 0) -> pd.DataFrame:
+    """Build a frame of parsed start times with hour, weekday and month codes and a synthetic user type."""
+    start = parse_timestamps(values).dropna()
+    rng = np.random.default_rng(seed)
+    user_types = pd.Categorical.from_codes(rng.choice(3, len(start), p=[0.75, 0.24, 0.01]),
+                                           categories=['Customer', 'Dependent', 'Subscriber'])
+    return pd.DataFrame({
+        COL_START_TIME: start.to_numpy(),
+        'hour': start.dt.hour.to_numpy(np.int8),
+        'day_of_week': start.dt.dayofweek.to_numpy(np.int8),
+        'month': start.dt.month.to_numpy(np.int8),
+        COL_USER_TYPE: user_types,
+    })
+
+
+def benchmark_count_matrices(df: pd.DataFrame, repeats: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Compare pivot_table counting with count_matrix for the dashboard's 2-D count matrices.
+
+    Args:
+        df: Frame from trip_frame
+        repeats: Number of runs per method (best time is kept)
+
+    Returns:
+        Dict[str, Dict[str, float]]: Rows per second of each method, per matrix
+    """
+    user_types = df[COL_USER_TYPE].cat
+    matrices = {
+        'hour x weekday': ('hour', 'day_of_week', lambda: count_matrix(
+            df['hour'].to_numpy(), df['day_of_week'].to_numpy(), (24, 7))),
+        'month x hour': ('month', 'hour', lambda: count_matrix(
+            df['month'].to_numpy() - 1, df['hour'].to_numpy(), (12, 24))),
+        'user type x hour': (COL_USER_TYPE, 'hour', lambda: count_matrix(
+            user_types.codes.to_numpy(), df['hour'].to_numpy(), (len(user_types.categories), 24))),
+    }
+
+    results = {}
+    for name, (index, columns, kernel) in matrices.items():
+        pivot = lambda: df.pivot_table(values=COL_START_TIME, index=index, columns=columns,
+                                       aggfunc='count', observed=True)
+        # Both paths must agree before their speed is compared
+        expected = pivot().fillna(0).to_numpy(np.int64)
+        counts = kernel()
+        np.testing.assert_array_equal(counts[np.ix_(counts.sum(axis=1) > 0, counts.sum(axis=0) > 0)], expected,
+                                      err_msg=f"count_matrix disagrees with pivot_table on {name}")
+
+        results[name] = {
+            'pivot_table': len(df) / _time_call(pivot, repeats),
+            'count_matrix': len(df) / _time_call(kernel, repeats),
+        }
+    return results
+
+
+def load_timestamps(file_path: Optional[Path], n_rows: int) -> pd.Series:
+    """Read Start Time strings from a city file, or synthesize them."""
+    if file_path is not None and file_path.exists():
+        print(f"📂 Reading '{COL_START_TIME}' from {file_path}")
+        return pd.read_csv(file_path, usecols=[COL_START_TIME], dtype=str, nrows=n_rows)[COL_START_TIME]
+    
+    print(f"🧪 Generating {n_rows:,} synthetic timestamps")
+    return synthetic_timestamps(n_rows)
+
+
+def main():
+    """Main function to run the benchmarks."""
+    parser = argparse.ArgumentParser(description="Bikeshare performance benchmarks")
+    parser.add_argument('--file', type=Path, default=None, help="City CSV to take timestamps from")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Number of rows to benchmark")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per benchmark (best is kept)")
+    args = parser.parse_args()
+    
+    print("⏱️  TIMESTAMP PARSING BENCHMARK")
+    print("=" * 50)
+    values = load_timestamps(args.file, args.rows)
+    results = benchmark_timestamp_parsing(values, args.repeats)
+    baseline = results['pd.to_datetime(errors=coerce)']
+    for name, rows_per_sec in results.items():
+        print(f"   {name:<32} {rows_per_sec:>14,.0f} rows/s  ({rows_per_sec / baseline:.1f}x)")
+    print("-" * 50)
+
+    print("\n🔥 COUNT MATRIX BENCHMARK")
+    print("=" * 50)
+    for matrix, results in benchmark_count_matrices(trip_frame(values), args.repeats).items():
+        print(f"   {matrix}:")
+        baseline = results['pivot_table']
+        for name, rows_per_sec in results.items():
+            print(f"      {name:<29} {rows_per_sec:>14,.0f} rows/s  ({rows_per_sec / baseline:.1f}x)")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Bikeshare Trip Cube
+===================
+Pre-aggregated trip counts and duration sums for the web app's dashboards.
+
+Every sidebar filter except the custom date range is a (month, weekday,
+hour) restriction, so all aggregates are kept per time cell (12 x 7 x 24 =
+2016 cells): trip counts, duration sums/extremes/quantile samples and date
+bounds, plus one count matrix per categorical dimension (user type, gender,
+birth year, start station, end station). Routes are kept sparse, as counts
+per observed (time cell, route) pair, counted in row chunks and optionally
+capped at a total number of counters, so the route table never holds more
+than the budget plus one chunk's pairs.
+
+A filter combination selects a set of time cells, and every number on the
+dashboard is a sum over those cells, so answering does not depend on the
+number of trips.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bikeshare_kernels import code_counts, count_matrix, top_k
+from bikeshare_sketches import group_samples, weighted_quantiles
+from bikeshare_storage import (COL_BIRTH_YEAR, COL_END_STATION, COL_GENDER, COL_START_STATION,
+                               COL_TRIP_DURATION, COL_USER_TYPE, DAY_NAMES, ensure_features, rank_routes,
+                               route_keys)
+
+# Time cells: (month, weekday, hour)
+TIME_SHAPE = (12, 7, 24)
+N_TIME_CELLS = 12 * 7 * 24
+
+# Rows whose (time cell, route) pairs are counted at once while building the
+# route table
+ROUTE_CHUNK_ROWS = 1_000_000
+
+
+def time_cells(df: pd.DataFrame) -> np.ndarray:
+    """Return the (month, weekday, hour) cell of every trip."""
+    ensure_features(df, ['month', 'day_of_week', 'hour'])
+    return (((df['month'].to_numpy(np.int64) - 1) * 7 + df['day_of_week'].to_numpy(np.int64)) * 24
+            + df['hour'].to_numpy(np.int64))
+
+
+def _dimension_codes(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Return integer codes (-1 for missing) and labels of a dimension column."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(np.int64), values.cat.categories
+    codes, labels = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), pd.Index(labels)
+
+
+def _cell_extremes(cells: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return per-cell minimum and maximum of values (NaN for empty cells)."""
+    extremes = pd.Series(values).groupby(cells).agg(['min', 'max'])
+    minimum = np.full(N_TIME_CELLS, np.nan)
+    maximum = np.full(N_TIME_CELLS, np.nan)
+    minimum[extremes.index] = extremes['min']
+    maximum[extremes.index] = extremes['max']
+    return minimum, maximum
+
+
+class TripCube:
+    """
+    Trip aggregates per (month, weekday, hour) cell of one city frame.
+
+    Build it once per loaded frame; select() then answers the dashboard's
+    questions for any month/day/hour filter combination.
+    """
+
+    DIMENSIONS = [COL_USER_TYPE, COL_GENDER, COL_BIRTH_YEAR, COL_START_STATION, COL_END_STATION]
+
+    def __init__(self, df: pd.DataFrame, route_counters: Optional[int] = None):
+        """
+        Aggregate a preprocessed trip frame.
+
+        Args:
+            df: Preprocessed frame (e.g. from load_city_data)
+            route_counters: Keep at most this many (time cell, route) counters,
+                the busiest ones (None to keep every route); route counts then
+                become lower bounds, off by at most the selection's route_error
+        """
+        cells = time_cells(df)
+        self.trips = code_counts(cells, minlength=N_TIME_CELLS)
+
+        days = ensure_features(df, ['date_code'])['date_code'].to_numpy()
+        self.first_day, self.last_day = _cell_extremes(cells, days)
+
+        # Duration sums and extremes over trips with a known duration
+        self.has_duration = COL_TRIP_DURATION in df.columns
+        if self.has_duration:
+            durations = df[COL_TRIP_DURATION].to_numpy(dtype=np.float64, na_value=np.nan)
+            known = ~np.isnan(durations)
+            self.duration_count = np.bincount(cells[known], minlength=N_TIME_CELLS)
+            self.duration_sum = np.bincount(cells[known], weights=durations[known], minlength=N_TIME_CELLS)
+            self.duration_min, self.duration_max = _cell_extremes(cells[known], durations[known])
+            # Weighted quantile samples per cell, merged at query time
+            self.duration_samples, self.duration_weights, offsets = group_samples(
+                cells[known], durations[known], N_TIME_CELLS)
+            self.duration_sample_cells = np.repeat(np.arange(N_TIME_CELLS), np.diff(offsets))
+
+        # One (cell x label) count matrix per categorical dimension
+        self.labels: Dict[str, pd.Index] = {}
+        self.counts: Dict[str, np.ndarray] = {}
+        for dim in self.DIMENSIONS:
+            if dim not in df.columns:
+                continue
+            codes, labels = _dimension_codes(df[dim])
+            self.counts[dim] = count_matrix(cells, codes, (N_TIME_CELLS, len(labels))).astype(np.int32)
+            self.labels[dim] = labels
+
+        # Routes: sparse counts per observed (cell, route), ordered by cell
+        self.has_routes = COL_START_STATION in df.columns and COL_END_STATION in df.columns
+        if self.has_routes:
+            self.stations = df[COL_START_STATION].cat.categories
+            n_routes = max(len(self.stations) ** 2, 1)
+            self.route_floor = np.zeros(N_TIME_CELLS, dtype=np.int64)
+            packed = np.empty(0, dtype=np.int64)
+            trips = np.empty(0, dtype=np.int64)
+            for start in range(0, len(df), ROUTE_CHUNK_ROWS):
+                rows = slice(start, start + ROUTE_CHUNK_ROWS)
+                keys = route_keys(df.iloc[rows])
+                known = keys >= 0
+                chunk, chunk_trips = np.unique(cells[rows][known] * n_routes + keys[known],
+                                               return_counts=True)
+                packed, trips = self._merge_routes(packed, trips, chunk, chunk_trips)
+                if route_counters is not None and len(packed) > route_counters:
+                    packed, trips = self._truncate_routes(packed, trips, n_routes, route_counters)
+
+            self.route_ids = packed % n_routes
+            self.route_trips = trips
+            self.route_offsets = np.searchsorted(packed // n_routes, np.arange(N_TIME_CELLS + 1))
+
+    @staticmethod
+    def _merge_routes(packed: np.ndarray, trips: np.ndarray, chunk: np.ndarray,
+                      chunk_trips: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Add a chunk's sorted (cell, route) counts to the running sorted counts."""
+        if len(packed) == 0:
+            return chunk, chunk_trips
+        merged, inverse = np.unique(np.concatenate([packed, chunk]), return_inverse=True)
+        totals = np.zeros(len(merged), dtype=np.int64)
+        np.add.at(totals, inverse, np.concatenate([trips, chunk_trips]))
+        return merged, totals
+
+    def _truncate_routes(self, packed: np.ndarray, trips: np.ndarray, n_routes: int,
+                         route_counters: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Keep the busiest route_counters counters.
+
+        A dropped route may reappear in a later chunk and be counted from
+        zero, so every truncation adds the largest count it dropped in a cell
+        to that cell's route_floor: no route count in the cell is short by
+        more than the floor.
+        """
+        kept = np.zeros(len(packed), dtype=bool)
+        kept[top_k(trips, route_counters)] = True
+        dropped_max = np.zeros(N_TIME_CELLS, dtype=np.int64)
+        np.maximum.at(dropped_max, packed[~kept] // n_routes, trips[~kept])
+        self.route_floor += dropped_max
+        return packed[kept], trips[kept]
+
+    def cells(self, months: Optional[Iterable[int]] = None, days: Optional[Iterable[int]] = None,
+              hours: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Return the boolean mask of the time cells matching the filters.
+
+        Args:
+            months: Month numbers to keep (None for all)
+            days: Weekday codes to keep, 0 = Monday (None for all)
+            hours: Hours to keep (None for all)
+        """
+        months = np.arange(12) if months is None else np.asarray(list(months)) - 1
+        days = np.arange(7) if days is None else np.asarray(list(days))
+        hours = np.arange(24) if hours is None else np.asarray(list(hours))
+        mask = np.zeros(TIME_SHAPE, dtype=bool)
+        mask[np.ix_(months, days, hours)] = True
+        return mask.ravel()
+
+    def select(self, months: Optional[Iterable[int]] = None, days: Optional[Iterable[int]] = None,
+               hours: Optional[Iterable[int]] = None) -> 'CubeSelection':
+        """Return the aggregates of the trips matching the filters (see cells())."""
+        return CubeSelection(self, self.cells(months, days, hours))
+
+
+class CubeSelection:
+    """Aggregates of a TripCube restricted to a set of time cells."""
+
+    def __init__(self, cube: TripCube, cells: np.ndarray):
+        """
+        Args:
+            cube: The cube to answer from
+            cells: Boolean mask of the selected time cells
+        """
+        self.cube = cube
+        self.cells = cells
+        self.trips = int(cube.trips[cells].sum())
+
+    def date_span(self) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """Return the first and last trip date, or None without trips."""
+        if self.trips == 0:
+            return None
+        first = np.nanmin(self.cube.first_day[self.cells])
+        last = np.nanmax(self.cube.last_day[self.cells])
+        return pd.Timestamp(int(first), unit='D'), pd.Timestamp(int(last), unit='D')
+
+    def duration_stats(self) -> Optional[Tuple[float, float, float]]:
+        """Return the mean, minimum and maximum trip duration in seconds, or None."""
+        if not self.cube.has_duration:
+            return None
+        count = self.cube.duration_count[self.cells].sum()
+        if count == 0:
+            return None
+        return (self.cube.duration_sum[self.cells].sum() / count,
+                float(np.nanmin(self.cube.duration_min[self.cells])),
+                float(np.nanmax(self.cube.duration_max[self.cells])))
+
+    def duration_quantiles(self, quantiles: List[float]) -> Optional[np.ndarray]:
+        """Return trip duration quantiles in seconds (rank error below 2 / SKETCH_K), or None."""
+        if not self.cube.has_duration or self.cube.duration_count[self.cells].sum() == 0:
+            return None
+        selected = self.cells[self.cube.duration_sample_cells]
+        return weighted_quantiles(self.cube.duration_samples[selected], self.cube.duration_weights[selected],
+                                  quantiles)
+
+    def hour_day_counts(self) -> pd.DataFrame:
+        """Return trip counts with one row per hour and one column per weekday."""
+        counts = np.where(self.cells, self.cube.trips, 0).reshape(TIME_SHAPE).sum(axis=0)
+        return pd.DataFrame(counts.T, index=pd.RangeIndex(24, name='hour'), columns=DAY_NAMES)
+
+    def has(self, dim: str) -> bool:
+        """Return whether the cube holds a dimension."""
+        return dim in self.cube.counts
+
+    def counts(self, dim: str, k: Optional[int] = None) -> pd.Series:
+        """Return trip counts per label of a dimension, busiest first (labels without trips dropped)."""
+        totals = self.cube.counts[dim][self.cells].sum(axis=0, dtype=np.int64)
+        top = top_k(totals, len(totals) if k is None else k)
+        top = top[totals[top] > 0]
+        return pd.Series(totals[top], index=self.cube.labels[dim][top], name='count')
+
+    @property
+    def route_error(self) -> int:
+        """
+        Most trips a route count from top_routes may be missing.
+
+        The sum over the selected cells of the route_floor that capping the
+        route counters left in each cell; 0 unless the cube caps its routes.
+        """
+        return int(self.cube.route_floor[self.cells].sum())
+
+    def top_routes(self, k: int = 10) -> pd.Series:
+        """Return the k busiest routes, labelled 'Start → End' (see rank_routes)."""
+        offsets = self.cube.route_offsets
+        ranges = [slice(offsets[cell], offsets[cell + 1]) for cell in np.flatnonzero(self.cells)]
+        if not ranges:
+            return rank_routes(np.empty(0, dtype=np.int64), self.cube.stations, k)
+        route_ids = np.concatenate([self.cube.route_ids[r] for r in ranges])
+        trips = np.concatenate([self.cube.route_trips[r] for r in ranges])
+        return rank_routes(route_ids, self.cube.stations, k, weights=trips)
@@ -0,0 +1,234 @@
+"""
+Bikeshare Count Kernels
+=======================
+Counting, mode and top-k on integer codes, and 2-D count matrices.
+
+Months, weekdays, hours and categorical columns (stations, user types) are
+small integer codes, so their counts are one np.bincount pass instead of a
+hash-table value_counts(), and a mode or top-k is read off the count array
+instead of re-scanning the trips. Ties always go to the smallest code, as
+with Series.mode() and a stable sort. count_matrix does the same for pairs
+of codes (hour x weekday, month x hour, user type x hour), replacing a
+pivot_table/crosstab groupby with one bincount over packed codes.
+
+bucket_stats summarizes a float column (bucket counts, count, sum, min, max
+and missing values) in a single loop, compiled with numba when it is
+installed and falling back to NumPy otherwise.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    NUMBA_AVAILABLE = False
+
+
+def code_counts(codes: np.ndarray, minlength: int = 0, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Count (or sum weights) per non-negative integer code.
+
+    Args:
+        codes: Integer codes; negative codes (missing values) are ignored
+        minlength: Minimum length of the result (e.g. the number of categories)
+        weights: Optional weight per code
+
+    Returns:
+        np.ndarray: Counts indexed by code
+    """
+    codes = np.asarray(codes)
+    if codes.dtype.kind == 'b':
+        codes = codes.view(np.int8)
+    if codes.dtype.kind == 'i' and len(codes) and codes.min() < 0:
+        known = codes >= 0
+        codes = codes[known]
+        weights = None if weights is None else np.asarray(weights)[known]
+    counts = np.bincount(codes, weights=weights, minlength=minlength)
+    return counts if weights is not None else counts.astype(np.int64, copy=False)
+
+
+def count_matrix(rows: np.ndarray, cols: np.ndarray, shape: Tuple[int, int],
+                 weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Count (or sum weights) per pair of integer codes.
+
+    The pairs are packed as row * n_cols + col and counted with a single
+    bincount, e.g. count_matrix(hour, weekday, (24, 7)) is the hour x weekday
+    trip heatmap.
+
+    Args:
+        rows: Row codes in [0, shape[0]); negative codes (missing values) are ignored
+        cols: Column codes in [0, shape[1]); negative codes are ignored
+        shape: (number of rows, number of columns)
+        weights: Optional weight per pair
+
+    Returns:
+        np.ndarray: Matrix of the given shape
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    n_rows, n_cols = shape
+    known = (rows >= 0) & (cols >= 0)
+    if not known.all():
+        rows, cols = rows[known], cols[known]
+        weights = None if weights is None else np.asarray(weights)[known]
+    return code_counts(rows * n_cols + cols, minlength=n_rows * n_cols, weights=weights).reshape(shape)
+
+
+def count_mode(counts: np.ndarray) -> Tuple[int, int]:
+    """
+    Return the most frequent code and its count.
+
+    Args:
+        counts: Counts indexed by code (e.g. from code_counts)
+
+    Returns:
+        Tuple[int, int]: (code, count); ties go to the smallest code
+    """
+    code = int(np.argmax(counts))
+    return code, int(counts[code])
+
+
+def top_k(counts: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the codes of the k largest counts, largest first.
+
+    Only the k winners are sorted: a partition finds the k-th largest count,
+    and ties at that boundary are resolved by code, so the result equals the
+    first k entries of a stable descending sort.
+
+    Args:
+        counts: Counts indexed by code
+        k: Number of codes to return
+
+    Returns:
+        np.ndarray: Codes ordered by count (descending), then by code
+    """
+    counts = np.asarray(counts)
+    k = min(k, len(counts))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(counts, len(counts) - k)[len(counts) - k]
+    above = np.flatnonzero(counts > kth)
+    ties = np.flatnonzero(counts == kth)[:k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.lexsort((top, -counts[top]))]
+
+
+def label_counts(values: pd.Series, k: Optional[int] = None) -> pd.Series:
+    """
+    Count trips per value of a column, like value_counts() on integer codes.
+
+    Categorical columns are counted on their codes and integer columns on
+    their offset from the minimum; anything else falls back to
+    value_counts().
+
+    Args:
+        values: Column to count; missing values are ignored
+        k: Only return the k most frequent values, busiest first (None for
+            all values in label order, including unused categories)
+
+    Returns:
+        pd.Series: Counts indexed by value
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        labels = values.cat.categories
+        counts = code_counts(values.cat.codes.to_numpy(), minlength=len(labels))
+        index = pd.CategoricalIndex(labels, dtype=values.dtype, name=values.name)
+    elif pd.api.types.is_integer_dtype(values.dtype):
+        known = values.dropna().to_numpy(np.int64)
+        first = int(known.min()) if len(known) else 0
+        counts = code_counts(known - first)
+        present = np.flatnonzero(counts)
+        counts = counts[present]
+        index = pd.Index(present + first, name=values.name)
+    else:
+        counts = values.value_counts(sort=False)
+        index, counts = counts.index, counts.to_numpy(np.int64)
+
+    if k is not None:
+        top = top_k(counts, k)
+        top = top[counts[top] > 0]
+        index, counts = index[top], counts[top]
+    return pd.Series(counts, index=index, name='count')
+
+
+@dataclass
+class BucketStats:
+    """Single-pass summary of a float column (see bucket_stats)."""
+    counts: np.ndarray  # Values (or weights) per bucket
+    count: float  # Non-missing values
+    total: float  # Sum of the non-missing values
+    minimum: float  # inf without values
+    maximum: float  # -inf without values
+    missing: float  # NaN values
+
+
+def _bucket_stats_loop(values: np.ndarray, weights: np.ndarray, lower: np.ndarray,
+                       upper: np.ndarray) -> Tuple[np.ndarray, float, float, float, float, float]:
+    """Accumulate bucket counts, count, sum, extremes and NaNs in one loop (numba-compilable)."""
+    counts = np.zeros(len(lower))
+    count = total = missing = 0.0
+    minimum, maximum = np.inf, -np.inf
+    weighted = len(weights) > 0
+    for i in range(len(values)):
+        value = values[i]
+        weight = weights[i] if weighted else 1.0
+        if np.isnan(value):
+            missing += weight
+            continue
+        count += weight
+        total += value * weight
+        minimum = min(minimum, value)
+        maximum = max(maximum, value)
+        for bucket in range(len(lower)):
+            if lower[bucket] <= value <= upper[bucket]:
+                counts[bucket] += weight
+    return counts, count, total, minimum, maximum, missing
+
+
+def _bucket_stats_numpy(values: np.ndarray, weights: np.ndarray, lower: np.ndarray,
+                        upper: np.ndarray) -> Tuple[np.ndarray, float, float, float, float, float]:
+    """Vectorized fallback of _bucket_stats_loop (one pass per statistic)."""
+    nan = np.isnan(values)
+    known = values[~nan]
+    if len(weights) == 0:
+        weights = np.ones(len(values))
+    known_weights = weights[~nan]
+    inside = (known >= lower[:, None]) & (known <= upper[:, None])
+    return (inside @ known_weights, float(known_weights.sum()), float(known @ known_weights),
+            float(known.min()) if len(known) else np.inf, float(known.max()) if len(known) else -np.inf,
+            float(weights[nan].sum()))
+
+
+_bucket_stats = (numba.njit(cache=True, nogil=True)(_bucket_stats_loop) if NUMBA_AVAILABLE
+                 else _bucket_stats_numpy)
+
+
+def bucket_stats(values: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                 weights: Optional[np.ndarray] = None) -> BucketStats:
+    """
+    Count values per bucket and summarize them in a single pass.
+
+    Args:
+        values: Float values (NaN marks missing values)
+        lower: Inclusive lower bound of every bucket
+        upper: Inclusive upper bound of every bucket (buckets may leave gaps)
+        weights: Optional weight per value (e.g. trips per birth year)
+
+    Returns:
+        BucketStats: Bucket counts, count, sum, min, max and missing values
+            (counts are integers unless weights are floats)
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    weights_in = np.empty(0) if weights is None else np.ascontiguousarray(weights, dtype=np.float64)
+    counts, count, total, minimum, maximum, missing = _bucket_stats(
+        values, weights_in, np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64))
+    if weights is None or np.asarray(weights).dtype.kind in 'iu':
+        counts, count, missing = counts.astype(np.int64), int(count), int(missing)
+    return BucketStats(counts, count, total, minimum, maximum, missing)
@@ -0,0 +1,128 @@
+"""
+Bikeshare Result Cache
+======================
+Memoized analysis results, shared by the web app and the command-line tool.
+
+Results are keyed by the city, its dataset version (see
+bikeshare_storage.dataset_version) and the filters, so a repeated view is a
+dictionary lookup, and a changed or appended data file misses instead of
+serving stale numbers. Entries are evicted least recently used first once
+their estimated size exceeds the memory budget.
+"""
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget of a result cache
+RESULT_CACHE_BYTES = 256 * 1024**2
+
+
+def result_nbytes(value: Any, _seen: Optional[set] = None) -> int:
+    """
+    Estimate the memory held by a cached result.
+
+    Arrays and pandas objects report their buffers; containers and plain
+    objects (e.g. dataclasses) are summed over their contents. Objects
+    reachable more than once are counted once.
+
+    Args:
+        value: Result to measure
+
+    Returns:
+        int: Estimated size in bytes
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_nbytes(k, seen) + result_nbytes(v, seen)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(result_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return sys.getsizeof(value) + result_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of analysis results with a memory budget.
+
+    A result larger than the whole budget is returned but not stored.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES):
+        """
+        Args:
+            max_bytes: Memory budget for all entries, in estimated bytes
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached result (marking it recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a result, evicting the least recently used entries to stay within the budget."""
+        size = result_nbytes(value)
+        if size > self.max_bytes:
+            logger.info(f"Result of {size / 1024**2:.1f} MB exceeds the cache budget; not cached")
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return a cached result, computing and storing it on a miss.
+
+        The computation runs outside the lock, so concurrent misses on the
+        same key may both compute it; the last one stored wins.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,1186 @@
+"""
+Bikeshare Columnar Storage
+==========================
+Shared loading layer for the command-line analyzer and the web application.
+
+The first load of a city CSV is parsed once and exported to a column store
+next to the data file: one ``.npy`` file per column, a dictionary file with
+the categories behind each categorical code column, and a manifest. The
+store holds the parsed timestamps, the categorical station/user-type columns
+and the derived time features, and is rebuilt automatically whenever the
+source file's size or mtime changes. Start and End Station are encoded
+against one shared station dictionary, so their codes compare directly.
+Builds are serialized across processes through a lock file next to the
+store, and a finished store is swapped in by renaming, so readers never see
+a partially written or half-replaced store.
+
+Columns are opened with ``np.load(mmap_mode='r')``, so loading is near
+instant and every process on the host shares the same pages through the OS
+page cache. Rows are sorted by Start Time and the manifest keeps the row
+offset of every day, so month, weekday and date-range filters are pushed
+down into the read as slices of the mapped columns (a single zero-copy view
+for a month or a date range). Without a store the CSV is read in chunks and
+non-matching rows are dropped per chunk.
+
+New monthly exports are appended to an existing store with the ``ingest``
+command: only the new file is parsed, the stored columns are merged in
+Start Time order, and the per-month aggregates in the manifest are
+recomputed for the affected months only.
+
+Each city file is read with a declared schema (narrow numeric types,
+categoricals, and only the columns the analyses use) instead of letting
+pandas infer float64/object columns. Start/End Time are parsed with the
+known fixed format; only rows that fail it go through the slow
+per-element parser.
+
+Only the date code, month, weekday and hour are stored with the trips;
+other per-trip features (e.g. the weekend flag) are derived once, eagerly,
+with ``ensure_features`` by the code that owns the frame. Date attributes come from a small calendar table with one row per
+day, gathered to trips through an integer date code instead of decoding
+every timestamp.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from bikeshare_kernels import top_k
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    PYARROW_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the platform
+    FCNTL_AVAILABLE = False
+
+# Directory (created next to the CSV files) that holds the column stores
+CACHE_DIR_NAME = '.bikeshare_cache'
+
+# Bump whenever the stored layout or preprocessing changes
+CACHE_VERSION = 10
+
+# Files inside each city's column store
+MANIFEST_FILE = 'manifest.json'
+DICTIONARY_FILE = 'dictionaries.json'
+
+# Timestamp layout used by all city exports
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Rows per chunk when streaming the CSV without a cache
+CSV_CHUNK_ROWS = 250_000
+
+# Column name constants
+COL_START_TIME = 'Start Time'
+COL_START_STATION = 'Start Station'
+COL_END_STATION = 'End Station'
+COL_USER_TYPE = 'User Type'
+COL_END_TIME = 'End Time'
+COL_TRIP_DURATION = 'Trip Duration'
+COL_GENDER = 'Gender'
+COL_BIRTH_YEAR = 'Birth Year'
+
+# Anything pd.Timestamp accepts as a calendar date
+DateLike = Union[str, date, pd.Timestamp]
+
+CATEGORICAL_COLUMNS = [COL_START_STATION, COL_END_STATION, COL_USER_TYPE, COL_GENDER]
+
+# Start and End Station are encoded against one station dictionary per city,
+# so their codes can be compared and paired directly
+STATION_COLUMNS = [COL_START_STATION, COL_END_STATION]
+STATION_DICTIONARY = 'stations'
+
+# Declared CSV schemas keyed by city file name. Only these columns are read
+# (the unnamed index column is skipped). Stations are converted to
+# categoricals after filtering so chunked reads share one category set.
+_BASE_SCHEMA: Dict[str, str] = {
+    COL_START_TIME: 'str',
+    COL_END_TIME: 'str',
+    COL_START_STATION: 'str',
+    COL_END_STATION: 'str',
+    COL_USER_TYPE: 'category',
+}
+
+CITY_SCHEMAS: Dict[str, Dict[str, str]] = {
+    'chicago.csv': {
+        **_BASE_SCHEMA,
+        COL_TRIP_DURATION: 'Int32',
+        COL_GENDER: 'category',
+        COL_BIRTH_YEAR: 'Int16',
+    },
+    'new_york_city.csv': {
+        **_BASE_SCHEMA,
+        COL_TRIP_DURATION: 'Int32',
+        COL_GENDER: 'category',
+        COL_BIRTH_YEAR: 'Int16',
+    },
+    'washington.csv': {
+        **_BASE_SCHEMA,
+        COL_TRIP_DURATION: 'float32',
+    },
+}
+
+
+def source_fingerprint(file_path: Path) -> Dict[str, int]:
+    """Return the size/mtime signature used to detect a changed source file."""
+    stat = file_path.stat()
+    return {
+        'version': CACHE_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def _parse_fixed_format(values: pd.Series) -> pd.Series:
+    """Parse strings in TIMESTAMP_FORMAT, returning NaT for anything else."""
+    if PYARROW_AVAILABLE:
+        # Arrow's strptime runs the fixed format in C++ without format checks per row
+        parsed = pc.strptime(pa.array(values, from_pandas=True), format=TIMESTAMP_FORMAT,
+                             unit='s', error_is_null=True)
+        return pd.Series(parsed.to_numpy(zero_copy_only=False), index=values.index, name=values.name)
+    return pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce').astype('datetime64[s]')
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Parse timestamp strings using the fixed export format.
+
+    Rows that do not match TIMESTAMP_FORMAT are re-parsed individually with
+    format inference; anything still unparseable becomes NaT.
+
+    Args:
+        values: Timestamp strings
+
+    Returns:
+        pd.Series: Parsed datetime64[s] values
+    """
+    parsed = _parse_fixed_format(values)
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        parsed.loc[failed] = pd.to_datetime(values[failed], format='mixed', errors='coerce').astype('datetime64[s]')
+    return parsed
+
+
+def _parse_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse timestamps and derive the time features for a block of raw rows."""
+    # Convert datetime, dropping rows with invalid start dates
+    df[COL_START_TIME] = parse_timestamps(df[COL_START_TIME])
+    if COL_END_TIME in df.columns:
+        df[COL_END_TIME] = parse_timestamps(df[COL_END_TIME])
+    df = df.dropna(subset=[COL_START_TIME])
+
+    # The features used for slicing and filtering are stored with the
+    # trips; the others are added by their users (see ensure_features)
+    for name in STORED_FEATURES:
+        df[name] = DERIVED_FEATURES[name](df)
+    return df
+
+
+def date_code(value: DateLike) -> int:
+    """Return the date code (days since 1970-01-01) of a calendar date."""
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+
+def _apply_filters(df: pd.DataFrame, month: Optional[int], day: Optional[str],
+                   start_date: Optional[DateLike] = None,
+                   end_date: Optional[DateLike] = None) -> pd.DataFrame:
+    """Keep only the rows matching the month/day filters and the inclusive date range."""
+    if month is not None:
+        df = df[df['month'] == month]
+    if day is not None:
+        df = df[df['day_of_week'] == DAY_NAMES.index(day)]
+    if start_date is not None:
+        df = df[df['date_code'] >= date_code(start_date)]
+    if end_date is not None:
+        df = df[df['date_code'] <= date_code(end_date)]
+    return df
+
+
+def _sort_by_start(df: pd.DataFrame) -> pd.DataFrame:
+    """Order trips by Start Time (stable, so equal times keep file order)."""
+    return df.sort_values(COL_START_TIME, kind='stable', ignore_index=True)
+
+
+def _finalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert to categorical data types if columns exist and reset the index."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # Recode both station columns against the union of their stations
+    stations = [col for col in STATION_COLUMNS if col in df.columns]
+    if len(stations) > 1:
+        categories = df[stations[0]].cat.categories
+        for col in stations[1:]:
+            categories = categories.union(df[col].cat.categories)
+        station_dtype = pd.CategoricalDtype(categories)
+        for col in stations:
+            df[col] = df[col].cat.set_categories(station_dtype.categories).astype(station_dtype)
+    return df.reset_index(drop=True)
+
+
+def preprocess_trips(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the shared parsing and feature derivation to a raw city frame.
+
+    Args:
+        df: Frame as read from the city CSV
+
+    Returns:
+        pd.DataFrame: Frame with parsed timestamps, categoricals and time features
+    """
+    return _finalize(_parse_chunk(df))
+
+
+def read_city_csv(file_path: Path, schema_name: Optional[str] = None,
+                  **kwargs) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Call pd.read_csv with the declared schema of a city file.
+
+    Files without a declared schema fall back to dtype inference, but the
+    unnamed index column is still skipped.
+
+    Args:
+        file_path: Path to the city CSV file
+        schema_name: City file name whose schema to use (defaults to file_path's name)
+        **kwargs: Extra arguments passed to pd.read_csv (e.g. chunksize)
+    """
+    schema = CITY_SCHEMAS.get(schema_name or Path(file_path).name)
+    if schema is None:
+        return pd.read_csv(file_path, usecols=lambda col: not col.startswith('Unnamed'), **kwargs)
+    return pd.read_csv(file_path, usecols=list(schema), dtype=schema, **kwargs)
+
+
+def iter_csv_chunks(file_path: Path, month: Optional[int] = None, day: Optional[str] = None,
+                    chunk_rows: int = CSV_CHUNK_ROWS, start_date: Optional[DateLike] = None,
+                    end_date: Optional[DateLike] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield parsed, filtered chunks of a city CSV without holding the whole file.
+
+    Args:
+        file_path: Path to the city CSV file
+        month: Month number to keep (None for all)
+        day: Day name to keep (None for all)
+        chunk_rows: Number of CSV rows parsed at a time
+        start_date: First date to keep (None for no lower bound)
+        end_date: Last date to keep, inclusive (None for no upper bound)
+
+    Yields:
+        pd.DataFrame: Parsed rows of one chunk that match the filters
+    """
+    for chunk in read_city_csv(file_path, chunksize=chunk_rows):
+        yield _apply_filters(_parse_chunk(chunk), month, day, start_date, end_date)
+
+
+def read_csv_filtered(file_path: Path, month: Optional[int] = None, day: Optional[str] = None,
+                      chunk_rows: int = CSV_CHUNK_ROWS, start_date: Optional[DateLike] = None,
+                      end_date: Optional[DateLike] = None) -> pd.DataFrame:
+    """
+    Read and preprocess a city CSV in chunks, dropping non-matching rows per chunk.
+
+    Args:
+        file_path: Path to the city CSV file
+        month: Month number to keep (None for all)
+        day: Day name to keep (None for all)
+        chunk_rows: Number of CSV rows parsed at a time
+        start_date: First date to keep (None for no lower bound)
+        end_date: Last date to keep, inclusive (None for no upper bound)
+
+    Returns:
+        pd.DataFrame: Preprocessed rows matching the filters, sorted by Start Time
+    """
+    chunks = list(iter_csv_chunks(file_path, month, day, chunk_rows, start_date, end_date))
+    return _sort_by_start(_finalize(pd.concat(chunks, ignore_index=True)))
+
+
+def store_path(file_path: Path, cache_dir: Optional[Path] = None) -> Path:
+    """Return the column store directory for a city CSV."""
+    cache_dir = Path(cache_dir) if cache_dir is not None else file_path.parent / CACHE_DIR_NAME
+    return cache_dir / file_path.stem
+
+
+@contextmanager
+def _store_lock(store_dir: Path, purpose: str = '', shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory lock on a store's lock file (``<store>.lock``).
+
+    Builds hold the exclusive build lock (``purpose=''``) for their whole
+    duration, so concurrent processes never build the same store twice.
+    The swap lock (``purpose='swap'``) is held exclusively while a finished
+    store is renamed into place and shared while a reader opens the store.
+    Where locking is unavailable (no fcntl, read-only cache directory) the
+    lock is skipped.
+
+    Args:
+        store_dir: Column store directory
+        purpose: Lock file suffix ('' for the build lock, 'swap' for the swap lock)
+        shared: Take a shared instead of an exclusive lock
+    """
+    suffix = f".{purpose}.lock" if purpose else '.lock'
+    lock_path = store_dir.with_name(store_dir.name + suffix)
+    handle = None
+    if FCNTL_AVAILABLE:
+        try:
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(lock_path, 'a')
+        except OSError as e:
+            logger.debug(f"Cannot lock {lock_path}: {e}")
+
+    if handle is None:
+        yield
+        return
+    try:
+        fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        handle.close()  # closing the file releases the lock
+
+
+def _read_manifest(file_path: Path, store_dir: Path,
+                   check_source: bool = True) -> Optional[Dict[str, Any]]:
+    """Return the store manifest if it is present and (optionally) still matches the source file."""
+    manifest_path = store_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable store manifest {manifest_path}: {e}")
+        return None
+
+    if check_source and manifest.get('source') != source_fingerprint(file_path):
+        logger.info(f"Column store for {file_path.name} is stale, rebuilding")
+        return None
+    return manifest
+
+
+def _day_offsets(date_codes: np.ndarray) -> Tuple[int, np.ndarray]:
+    """Return the first date code and the row offset of every day of sorted date codes."""
+    if len(date_codes) == 0:
+        return 0, np.zeros(1, dtype=np.int64)
+    first_day = int(date_codes[0])
+    return first_day, np.searchsorted(date_codes, np.arange(first_day, int(date_codes[-1]) + 2))
+
+
+def _row_slices(manifest: Dict[str, Any], month: Optional[int], day: Optional[str],
+                start_date: Optional[DateLike] = None,
+                end_date: Optional[DateLike] = None) -> List[slice]:
+    """Translate the filters into row slices of the time-sorted store."""
+    first_day, offsets = manifest['first_day'], manifest['day_offsets']
+    n_days = len(offsets) - 1
+
+    # The date range narrows the days by offset arithmetic alone
+    lo = 0 if start_date is None else min(max(date_code(start_date) - first_day, 0), n_days)
+    hi = n_days if end_date is None else min(max(date_code(end_date) - first_day + 1, lo), n_days)
+    if month is None and day is None or lo == hi:
+        return [slice(offsets[lo], offsets[hi])]
+
+    calendar = calendar_table(first_day, n_days).iloc[lo:hi]
+    keep = np.ones(hi - lo, dtype=bool)
+    if month is not None:
+        keep &= calendar['month'].to_numpy() == month
+    if day is not None:
+        keep &= calendar['day_of_week'].to_numpy() == DAY_NAMES.index(day)
+
+    # Every run of consecutive matching days is one contiguous row slice
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], keep, [False]]).astype(np.int8)))
+    return [slice(offsets[lo + a], offsets[lo + b]) for a, b in zip(edges[::2], edges[1::2])]
+
+
+def _take(arr: np.ndarray, slices: List[slice]) -> np.ndarray:
+    """Select row slices of a mapped column (a zero-copy view for a single slice)."""
+    if len(slices) == 1:
+        return arr[slices[0]]
+    if not slices:
+        return arr[:0]
+    return np.concatenate([arr[s] for s in slices])
+
+
+def _read_store(store_dir: Path, manifest: Dict[str, Any], month: Optional[int],
+                day: Optional[str], start_date: Optional[DateLike] = None,
+                end_date: Optional[DateLike] = None) -> Optional[pd.DataFrame]:
+    """Map the stored columns and select the row slices matching the filters."""
+    try:
+        with open(store_dir / DICTIONARY_FILE, 'r', encoding='utf-8') as f:
+            dictionaries = json.load(f)
+
+        slices = _row_slices(manifest, month, day, start_date, end_date)
+        # One dtype object per dictionary, so columns sharing it compare directly
+        dtypes = {key: pd.CategoricalDtype(categories) for key, categories in dictionaries.items()}
+        columns = {}
+        for name, spec in manifest['columns'].items():
+            values = _take(np.load(store_dir / spec['file'], mmap_mode='r'), slices)
+            if spec['kind'] == 'categorical':
+                values = pd.Categorical.from_codes(values, dtype=dtypes[spec.get('dictionary', name)])
+            elif spec['kind'] == 'nullable':
+                mask = _take(np.load(store_dir / spec['mask'], mmap_mode='r'), slices)
+                array_type = pd.api.types.pandas_dtype(spec['dtype']).construct_array_type()
+                values = array_type(values, mask)
+            columns[name] = values
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable column store {store_dir}: {e}")
+        return None
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def _column_file(name: str) -> str:
+    """Return a file-system friendly file name for a column."""
+    return name.lower().replace(' ', '_') + '.npy'
+
+
+def _code_dtype(n_categories: int) -> np.dtype:
+    """Return the code dtype pandas uses for n categories, so stored codes map back zero-copy."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _dictionary_key(name: str) -> str:
+    """Return the key of the dictionary a categorical column is encoded against."""
+    return STATION_DICTIONARY if name in STATION_COLUMNS else name
+
+
+def _encode_column(name: str, series: pd.Series, spec: Optional[Dict[str, str]] = None,
+                   dictionary: Optional[List[str]] = None
+                   ) -> Tuple[Dict[str, str], np.ndarray, Optional[np.ndarray], Optional[List[str]]]:
+    """
+    Encode a column for storage.
+
+    When appending, values are encoded against the stored spec and dictionary;
+    unseen categories are added to the end of the dictionary so existing codes
+    stay valid.
+
+    Returns:
+        Tuple: (column spec, values, mask for nullable columns, dictionary for categorical columns)
+    """
+    if spec is None:
+        spec = {'file': _column_file(name)}
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype):
+            spec['kind'] = 'categorical'
+            if name in STATION_COLUMNS:
+                spec['dictionary'] = STATION_DICTIONARY
+        elif isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            spec.update(kind='nullable', dtype=str(series.dtype), mask=_column_file(f"{name} mask"))
+        else:
+            spec['kind'] = 'numpy'
+
+    if spec['kind'] == 'categorical':
+        categorical = series.astype('category').array
+        categories = [str(c) for c in categorical.categories]
+        categorical = categorical.rename_categories(categories)
+        if not dictionary:
+            dictionary = categories
+        else:
+            known = set(dictionary)
+            dictionary = dictionary + [c for c in categories if c not in known]
+        # Recodes through the category mapping; no per-row string work
+        return spec, categorical.set_categories(dictionary).codes, None, dictionary
+
+    if spec['kind'] == 'nullable':
+        dtype = pd.api.types.pandas_dtype(spec['dtype'])
+        values = series.astype(dtype)
+        return spec, values.to_numpy(dtype=dtype.numpy_dtype, na_value=0), values.isna().to_numpy(), None
+
+    return spec, series.to_numpy(), None, None
+
+
+def _month_aggregates(df: pd.DataFrame) -> Dict[str, Any]:
+    """Summary statistics of one month's trips, kept in the manifest."""
+    start_times = df[COL_START_TIME]
+    aggregates: Dict[str, Any] = {
+        'trips': len(df),
+        'first_start': str(start_times.min()),
+        'last_start': str(start_times.max()),
+        'hour_counts': np.bincount(df['hour'], minlength=24).tolist(),
+        'weekday_counts': np.bincount(df['day_of_week'], minlength=7).tolist(),
+    }
+    if COL_TRIP_DURATION in df.columns:
+        durations = df[COL_TRIP_DURATION].dropna()
+        if not durations.empty:
+            aggregates.update(
+                duration_sum=float(durations.sum()),
+                duration_min=float(durations.min()),
+                duration_max=float(durations.max()),
+            )
+    return aggregates
+
+
+def _write_dictionaries(store_dir: Path, dictionaries: Dict[str, List[str]]) -> None:
+    """Write the dictionary file of a store."""
+    with open(store_dir / DICTIONARY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(dictionaries, f)
+
+
+def _commit_store(tmp_dir: Path, store_dir: Path, manifest: Dict[str, Any]) -> None:
+    """
+    Write the manifest and swap the finished store into place.
+
+    The old store is renamed aside before the new one is renamed in, under
+    the exclusive swap lock, so a reader holding the shared swap lock sees
+    either the complete old store or the complete new one. Arrays already
+    mapped from the old store stay valid after it is removed.
+    """
+    # The manifest is written last; a store without one is never read
+    with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    old_dir = store_dir.with_name(f"{store_dir.name}.old-{os.getpid()}")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    with _store_lock(store_dir, 'swap'):
+        if store_dir.exists():
+            os.rename(store_dir, old_dir)
+        os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _write_store(file_path: Path, df: pd.DataFrame, store_dir: Path,
+                 fingerprint: Dict[str, int]) -> None:
+    """Export a preprocessed frame to a column store, sorted by Start Time."""
+    df = _sort_by_start(df)
+    first_day, offsets = _day_offsets(df['date_code'].to_numpy())
+
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp-{os.getpid()}")
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        columns: Dict[str, Dict[str, str]] = {}
+        dictionaries: Dict[str, List[str]] = {}
+
+        for name in df.columns:
+            spec, values, mask, dictionary = _encode_column(
+                name, df[name], dictionary=dictionaries.get(_dictionary_key(name)))
+            np.save(tmp_dir / spec['file'], values)
+            if mask is not None:
+                np.save(tmp_dir / spec['mask'], mask)
+            if dictionary is not None:
+                dictionaries[spec.get('dictionary', name)] = dictionary
+            columns[name] = spec
+        _write_dictionaries(tmp_dir, dictionaries)
+
+        manifest = {
+            'source': fingerprint,
+            'batches': [],
+            'rows': len(df),
+            'columns': columns,
+            'first_day': first_day,
+            'day_offsets': offsets.tolist(),
+            'monthly_aggregates': {
+                str(month): _month_aggregates(trips) for month, trips in df.groupby('month')
+            },
+        }
+        _commit_store(tmp_dir, store_dir, manifest)
+    except OSError as e:
+        logger.warning(f"Could not write column store for {file_path.name}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _merge_sorted(old: np.ndarray, new: np.ndarray, insert_at: np.ndarray,
+                  out_path: Path, dtype: np.dtype) -> None:
+    """
+    Write old and new rows of a column in Start Time order.
+
+    insert_at holds, for every (sorted) new row, the old row it goes before.
+    Rows are copied in runs, so a batch that follows the stored history is a
+    plain concatenation and neither input is loaded into memory at once.
+    """
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(len(old) + len(new),))
+    points, starts = np.unique(insert_at, return_index=True)
+    ends = np.append(starts[1:], len(new))
+    src = dst = 0
+    for point, start, end in zip(points, starts, ends):
+        out[dst:dst + point - src] = old[src:point]
+        dst += point - src
+        src = point
+        out[dst:dst + end - start] = new[start:end]
+        dst += end - start
+    out[dst:] = old[src:]
+    out.flush()
+    del out
+
+
+def export_city(file_path: Path, cache_dir: Optional[Path] = None) -> Path:
+    """
+    Parse a city CSV and export it to its column store, replacing any existing store.
+
+    Args:
+        file_path: Path to the city CSV file
+        cache_dir: Cache directory (defaults to a hidden directory next to the CSV)
+
+    Returns:
+        Path: The column store directory
+    """
+    file_path = Path(file_path)
+    store_dir = store_path(file_path, cache_dir)
+    with _store_lock(store_dir):
+        _export_city(file_path, store_dir)
+    return store_dir
+
+
+def _export_city(file_path: Path, store_dir: Path) -> None:
+    """Export a city CSV to its column store; the caller holds the build lock."""
+    # Fingerprint before parsing so a file modified mid-read is rebuilt next time
+    fingerprint = source_fingerprint(file_path)
+    _write_store(file_path, preprocess_trips(read_city_csv(file_path)), store_dir, fingerprint)
+
+
+def append_batch(file_path: Path, batch_path: Path, cache_dir: Optional[Path] = None) -> List[int]:
+    """
+    Append a new trip export to a city's column store.
+
+    Only the batch is parsed: stored rows are copied from the mapped columns,
+    derived columns are computed for the new rows only and the monthly
+    aggregates are recomputed for the affected months only.
+
+    Args:
+        file_path: Path to the city CSV file the store was built from
+        batch_path: CSV with the new trips (same layout as the city file)
+        cache_dir: Cache directory (defaults to a hidden directory next to the CSV)
+
+    Returns:
+        List[int]: The months that received new trips
+    """
+    file_path, batch_path = Path(file_path), Path(batch_path)
+    store_dir = store_path(file_path, cache_dir)
+    with _store_lock(store_dir):
+        _ensure_store(file_path, store_dir)
+        return _append_batch(file_path, batch_path, store_dir)
+
+
+def _append_batch(file_path: Path, batch_path: Path, store_dir: Path) -> List[int]:
+    """Append a batch to an up-to-date column store; the caller holds the build lock."""
+    manifest = _read_manifest(file_path, store_dir)
+    if manifest is None:
+        raise RuntimeError(f"No column store available for {file_path.name}")
+
+    batch_info = {'path': str(batch_path.resolve()), **source_fingerprint(batch_path)}
+    if batch_info in manifest['batches']:
+        logger.warning(f"{batch_path.name} has already been appended to {file_path.name}")
+        return []
+
+    batch = preprocess_trips(read_city_csv(batch_path, schema_name=file_path.name))
+    missing = set(manifest['columns']) - set(batch.columns)
+    if missing:
+        raise ValueError(f"{batch_path.name} is missing columns: {', '.join(sorted(missing))}")
+    batch = _sort_by_start(batch)
+    stored_start = np.load(store_dir / manifest['columns'][COL_START_TIME]['file'], mmap_mode='r')
+    insert_at = np.searchsorted(stored_start, batch[COL_START_TIME].to_numpy(), side='right')
+
+    with open(store_dir / DICTIONARY_FILE, 'r', encoding='utf-8') as f:
+        dictionaries = json.load(f)
+
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp-{os.getpid()}")
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        # Encode everything first: shared dictionaries may grow with later columns
+        encoded = {}
+        for name, spec in manifest['columns'].items():
+            key = spec.get('dictionary', name)
+            encoded[name] = _encode_column(name, batch[name], spec, dictionaries.get(key))
+            if encoded[name][3] is not None:
+                dictionaries[key] = encoded[name][3]
+
+        for name, (spec, values, mask, dictionary) in encoded.items():
+            old = np.load(store_dir / spec['file'], mmap_mode='r')
+            if dictionary is not None:
+                dtype = _code_dtype(len(dictionaries[spec.get('dictionary', name)]))
+            else:
+                dtype = np.result_type(old.dtype, values.dtype)
+            _merge_sorted(old, values, insert_at, tmp_dir / spec['file'], dtype)
+            if mask is not None:
+                old_mask = np.load(store_dir / spec['mask'], mmap_mode='r')
+                _merge_sorted(old_mask, mask, insert_at, tmp_dir / spec['mask'], np.dtype(bool))
+        _write_dictionaries(tmp_dir, dictionaries)
+
+        merged_days = np.load(tmp_dir / manifest['columns']['date_code']['file'], mmap_mode='r')
+        first_day, offsets = _day_offsets(merged_days)
+        months = sorted(int(m) for m in np.unique(batch['month']))
+        manifest = {
+            **manifest,
+            'batches': manifest['batches'] + [batch_info],
+            'rows': len(merged_days),
+            'first_day': first_day,
+            'day_offsets': offsets.tolist(),
+        }
+        # Recompute the aggregates of the affected months from the merged columns
+        monthly = dict(manifest['monthly_aggregates'])
+        for month in months:
+            month_df = _read_store(tmp_dir, manifest, month, None)
+            monthly[str(month)] = _month_aggregates(month_df)
+        manifest['monthly_aggregates'] = monthly
+
+        _commit_store(tmp_dir, store_dir, manifest)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return months
+
+
+def ensure_city_store(file_path: Path, cache_dir: Optional[Path] = None) -> Path:
+    """
+    Export a city's column store unless an up-to-date one already exists.
+
+    When the city CSV has changed, batches previously appended to the store
+    are appended again to the rebuilt store. Builds are serialized through
+    the store's lock file: a process that finds a build in progress waits
+    for it and then uses its result instead of building again.
+
+    Args:
+        file_path: Path to the city CSV file
+        cache_dir: Cache directory (defaults to a hidden directory next to the CSV)
+
+    Returns:
+        Path: The column store directory
+    """
+    file_path = Path(file_path)
+    store_dir = store_path(file_path, cache_dir)
+    if _read_manifest(file_path, store_dir) is None:
+        with _store_lock(store_dir):
+            _ensure_store(file_path, store_dir)
+    return store_dir
+
+
+def _ensure_store(file_path: Path, store_dir: Path) -> None:
+    """Rebuild a missing or stale store; the caller holds the build lock."""
+    # Re-check under the lock: another process may have just built it
+    if _read_manifest(file_path, store_dir) is not None:
+        return
+    previous = _read_manifest(file_path, store_dir, check_source=False) or {}
+    _export_city(file_path, store_dir)
+    for batch in previous.get('batches', []):
+        batch_path = Path(batch['path'])
+        if batch_path.exists():
+            _append_batch(file_path, batch_path, store_dir)
+        else:
+            logger.warning(f"Appended batch {batch_path} no longer exists; dropped from the rebuilt store")
+
+
+def dataset_version(file_path: Path, cache_dir: Optional[Path] = None) -> str:
+    """
+    Return a cheap token that changes whenever a city's data changes.
+
+    Covers both the source CSV and the store manifest (which changes when
+    batches are appended), using only two stat calls.
+    """
+    file_path = Path(file_path)
+    parts = []
+    for path in (file_path, store_path(file_path, cache_dir) / MANIFEST_FILE):
+        try:
+            stat = path.stat()
+            parts.append(f"{stat.st_size}-{stat.st_mtime_ns}")
+        except OSError:
+            parts.append('missing')
+    return '/'.join(parts)
+
+
+class CityWarmUp:
+    """
+    Export the column stores of several cities in parallel worker processes.
+
+    The CSV parsing runs in a process pool in the background; callers can
+    wait for a single city or poll the status of all of them. Cities whose
+    store is already up to date are not submitted at all, and each worker
+    builds under the store's lock file and re-checks the manifest once it
+    holds it, so when several servers warm up the same cache directory only
+    one process builds each city and the others wait for its result.
+    """
+
+    def __init__(self, city_files: Dict[str, Path], cache_dir: Optional[Path] = None,
+                 max_workers: Optional[int] = None):
+        """
+        Start warming up every city whose data file exists.
+
+        Args:
+            city_files: City name -> CSV path
+            cache_dir: Cache directory (defaults to a hidden directory next to each CSV)
+            max_workers: Worker processes (defaults to one per city, capped at the CPU count)
+        """
+        existing = {city: Path(path) for city, path in city_files.items() if Path(path).exists()}
+        self.missing = [city for city in city_files if city not in existing]
+        self.futures: Dict[str, Future] = {}
+
+        stale = {}
+        for city, path in existing.items():
+            store_dir = store_path(path, cache_dir)
+            if _read_manifest(path, store_dir) is None:
+                stale[city] = path
+            else:
+                self.futures[city] = Future()
+                self.futures[city].set_result(store_dir)
+        if not stale:
+            return
+
+        workers = max_workers or min(len(stale), os.cpu_count() or 1)
+        # Spawn rather than fork: the caller (e.g. a Streamlit server) is multi-threaded
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'))
+        for city, path in stale.items():
+            self.futures[city] = executor.submit(ensure_city_store, path, cache_dir)
+        executor.shutdown(wait=False)
+
+    def wait(self, city: str) -> bool:
+        """Block until a city's store is ready; return False if its warm-up failed."""
+        future = self.futures.get(city)
+        if future is None:
+            return False
+        try:
+            future.result()
+            return True
+        except Exception as e:
+            logger.warning(f"Warm-up failed for {city}: {e}")
+            return False
+
+    def status(self) -> Dict[str, str]:
+        """Return 'warm', 'warming', 'failed' or 'missing' for every city."""
+        status = {city: 'missing' for city in self.missing}
+        for city, future in self.futures.items():
+            if not future.done():
+                status[city] = 'warming'
+            else:
+                status[city] = 'failed' if future.exception() is not None else 'warm'
+        return status
+
+
+def route_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    Pack every trip's route into one int64 key: start_code * n_stations + end_code.
+
+    Trips with a missing station get the key -1.
+
+    Args:
+        df: Preprocessed frame (Start and End Station share one station dictionary)
+
+    Returns:
+        np.ndarray: Route key per row
+    """
+    start, end = df[COL_START_STATION], df[COL_END_STATION]
+    if start.dtype != end.dtype:
+        raise ValueError("Start and End Station must be encoded against the same station dictionary")
+
+    start_codes = start.cat.codes.to_numpy(np.int64)
+    end_codes = end.cat.codes.to_numpy(np.int64)
+    keys = start_codes * len(start.cat.categories) + end_codes
+    keys[(start_codes < 0) | (end_codes < 0)] = -1
+    return keys
+
+
+@lru_cache(maxsize=32)
+def calendar_table(first_day: int, n_days: int) -> pd.DataFrame:
+    """
+    Build the calendar dimension for a contiguous range of days.
+
+    The result is cached and shared; do not modify it.
+
+    Args:
+        first_day: Date code (days since 1970-01-01) of the first day
+        n_days: Number of days covered
+
+    Returns:
+        pd.DataFrame: One row per date code with month, day_of_week (0 = Monday)
+        and is_weekend
+    """
+    dates = pd.date_range(pd.Timestamp(first_day, unit='D'), periods=n_days, freq='D')
+    return pd.DataFrame({
+        'month': dates.month.astype('int8'),
+        'day_of_week': dates.dayofweek.astype('int8'),
+        'is_weekend': dates.dayofweek >= DAY_NAMES.index('Saturday'),
+    }, index=pd.RangeIndex(first_day, first_day + n_days, name='date_code'))
+
+
+def _start_seconds(df: pd.DataFrame) -> np.ndarray:
+    """Return Start Time as int64 seconds since the epoch."""
+    return df[COL_START_TIME].to_numpy(dtype='datetime64[s]').view(np.int64)
+
+
+def _calendar_feature(name: str) -> Callable[[pd.DataFrame], np.ndarray]:
+    """Return a deriver that gathers one calendar attribute through the date code."""
+    def derive(df: pd.DataFrame) -> np.ndarray:
+        codes = ensure_features(df, ['date_code'])['date_code'].to_numpy()
+        if len(codes) == 0:
+            return calendar_table(0, 1)[name].to_numpy()[:0]
+        first_day = int(codes.min())
+        column = calendar_table(first_day, int(codes.max()) - first_day + 1)[name].to_numpy()
+        return column[codes - first_day]
+    return derive
+
+
+# Per-trip features derived from the parsed columns. Date attributes are
+# looked up once per calendar day and gathered through the integer date
+# code; weekday is an int8 code (0 = Monday) labelled via DAY_NAMES.
+DERIVED_FEATURES: Dict[str, Callable[[pd.DataFrame], Any]] = {
+    'date_code': lambda df: (_start_seconds(df) // 86_400).astype(np.int32),
+    'hour': lambda df: (_start_seconds(df) % 86_400 // 3_600).astype(np.int8),
+    'month': _calendar_feature('month'),
+    'day_of_week': _calendar_feature('day_of_week'),
+    'is_weekend': _calendar_feature('is_weekend'),
+}
+
+# Features materialized at parse time and kept in the column store, so
+# loading a city maps them instead of recomputing them
+STORED_FEATURES = ['date_code', 'month', 'day_of_week', 'hour']
+
+
+def ensure_features(df: pd.DataFrame, features: Iterable[str]) -> pd.DataFrame:
+    """
+    Add the requested derived feature columns the frame does not have yet.
+
+    Features are derived once, eagerly, and added to the frame in place, so
+    call this only on a frame nobody else is reading yet (e.g. right after
+    loading it, before it is cached or shared).
+
+    Args:
+        df: Preprocessed trip frame
+        features: Names from DERIVED_FEATURES
+
+    Returns:
+        pd.DataFrame: The same frame, for chaining
+    """
+    for name in features:
+        if name in df.columns:
+            continue
+        if name not in DERIVED_FEATURES:
+            raise ValueError(f"Unknown derived feature: {name}")
+        df[name] = DERIVED_FEATURES[name](df)
+    return df
+
+
+def rank_routes(keys: np.ndarray, stations: pd.Index, k: int = 10,
+                weights: Optional[np.ndarray] = None) -> pd.Series:
+    """
+    Count trips per packed route key and return the k busiest, labelled 'Start → End'.
+
+    Only the returned routes are turned into strings. Ties are ordered by
+    station code.
+
+    Args:
+        keys: Route keys (negative keys are ignored)
+        stations: The shared station dictionary the keys were packed with
+        k: Number of routes to return
+        weights: Trips per key (defaults to one per key)
+
+    Returns:
+        pd.Series: Trip counts indexed by route label, busiest first
+    """
+    valid = keys >= 0
+    keys = keys[valid]
+    weights = None if weights is None else weights[valid]
+    n_routes = len(stations) ** 2
+
+    # A dense count array is cheapest unless the route space dwarfs the data
+    if n_routes <= max(len(keys), 1 << 20):
+        counts = np.bincount(keys, weights=weights, minlength=n_routes).astype(np.int64)
+        route_ids = np.flatnonzero(counts)
+        counts = counts[route_ids]
+    elif weights is None:
+        route_ids, counts = np.unique(keys, return_counts=True)
+    else:
+        route_ids, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights).astype(np.int64)
+
+    top = top_k(counts, k)
+    labels = [f"{stations[key // len(stations)]} → {stations[key % len(stations)]}" for key in route_ids[top]]
+    return pd.Series(counts[top], index=pd.Index(labels, name='route'), name='trips')
+
+
+def top_routes(df: pd.DataFrame, k: int = 10) -> pd.Series:
+    """
+    Count trips per route and return the k busiest, labelled 'Start → End'.
+
+    Counting works on the packed route keys (see rank_routes).
+
+    Args:
+        df: Preprocessed frame (Start and End Station share one station dictionary)
+        k: Number of routes to return
+
+    Returns:
+        pd.Series: Trip counts indexed by route label, busiest first
+    """
+    return rank_routes(route_keys(df), df[COL_START_STATION].cat.categories, k)
+
+
+def time_range(df: pd.DataFrame, start: Optional[DateLike] = None,
+               end: Optional[DateLike] = None) -> pd.DataFrame:
+    """
+    Select the trips of a Start Time-sorted frame with start <= Start Time < end.
+
+    Two binary searches on the sorted column; the result is a slice of the frame.
+
+    Args:
+        df: Preprocessed frame sorted by Start Time (as returned by load_city_data)
+        start: Lower bound (None for no bound)
+        end: Exclusive upper bound (None for no bound)
+
+    Returns:
+        pd.DataFrame: The rows within the range
+    """
+    return df.iloc[time_range_rows(df, start, end)]
+
+
+def time_range_rows(df: pd.DataFrame, start: Optional[DateLike] = None,
+                    end: Optional[DateLike] = None) -> slice:
+    """Return the row positions selected by time_range as a slice."""
+    times = df[COL_START_TIME].to_numpy()
+    lo = 0 if start is None else int(np.searchsorted(times, pd.Timestamp(start).to_datetime64(), side='left'))
+    hi = len(times) if end is None else int(np.searchsorted(times, pd.Timestamp(end).to_datetime64(), side='left'))
+    return slice(lo, max(lo, hi))
+
+
+class TimeBucketIndex:
+    """
+    Row ids of a trip frame grouped by (month, weekday, hour) bucket.
+
+    Built once per loaded frame; any combination of month, weekday and hour
+    filters then resolves to a union of precomputed buckets instead of
+    comparing every row.
+    """
+
+    N_BUCKETS = 12 * 7 * 24
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Bucket every row of a preprocessed frame.
+
+        Args:
+            df: Frame with month, day_of_week and hour columns
+        """
+        buckets = (((df['month'].to_numpy(np.int16) - 1) * 7 + df['day_of_week'].to_numpy(np.int16)) * 24
+                   + df['hour'].to_numpy(np.int16))
+        # Stable, so the row ids inside every bucket stay ascending
+        self.row_ids = np.argsort(buckets, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(buckets, minlength=self.N_BUCKETS))])
+        self.n_rows = len(df)
+
+    def select(self, months: Optional[Iterable[int]] = None, days: Optional[Iterable[int]] = None,
+               hours: Optional[Iterable[int]] = None, rows: slice = slice(None)) -> np.ndarray:
+        """
+        Return the ascending ids of the rows in the selected buckets.
+
+        Args:
+            months: Month numbers to keep (None for all)
+            days: Weekday codes to keep, 0 = Monday (None for all)
+            hours: Hours to keep (None for all)
+            rows: Row range to restrict the result to (e.g. from time_range)
+
+        Returns:
+            np.ndarray: Row ids in frame order
+        """
+        start, stop, _ = rows.indices(self.n_rows)
+        if months is None and days is None and hours is None:
+            return np.arange(start, stop)
+
+        months = np.arange(1, 13) if months is None else np.asarray(list(months))
+        days = np.arange(7) if days is None else np.asarray(list(days))
+        hours = np.arange(24) if hours is None else np.asarray(list(hours))
+        buckets = np.unique(((months[:, None, None] - 1) * 7 + days[None, :, None]) * 24 + hours[None, None, :])
+
+        # Mark rows and read them back in order (O(rows) instead of a sort);
+        # for wide selections it is cheaper to clear the excluded buckets
+        invert = len(buckets) > self.N_BUCKETS // 2
+        if invert:
+            buckets = np.setdiff1d(np.arange(self.N_BUCKETS), buckets)
+        selected = np.full(self.n_rows, invert)
+        for bucket in buckets:
+            selected[self.row_ids[self.offsets[bucket]:self.offsets[bucket + 1]]] = not invert
+        return np.flatnonzero(selected[start:stop]) + start
+
+
+def load_city_data(file_path: Path, month: Optional[int] = None, day: Optional[str] = None,
+                   cache_dir: Optional[Path] = None, use_cache: bool = True,
+                   start_date: Optional[DateLike] = None,
+                   end_date: Optional[DateLike] = None) -> pd.DataFrame:
+    """
+    Load a preprocessed city frame, reading only the rows matching the filters.
+
+    Rows are sorted by Start Time. The returned columns are read-only memory
+    maps of the column store when one is available; add new columns rather
+    than modifying existing ones.
+
+    Args:
+        file_path: Path to the city CSV file
+        month: Month number to keep (None for all)
+        day: Day name to keep, e.g. 'Monday' (None for all)
+        cache_dir: Cache directory (defaults to a hidden directory next to the CSV)
+        use_cache: Set to False to always parse the CSV
+        start_date: First date to keep (None for no lower bound)
+        end_date: Last date to keep, inclusive (None for no upper bound)
+
+    Returns:
+        pd.DataFrame: Preprocessed trip data matching the filters
+    """
+    file_path = Path(file_path)
+    if not use_cache:
+        return read_csv_filtered(file_path, month, day, start_date=start_date, end_date=end_date)
+
+    store_dir = ensure_city_store(file_path, cache_dir)
+    # Open the store under the shared swap lock so a concurrent commit cannot
+    # replace the column files between reading the manifest and mapping them
+    with _store_lock(store_dir, 'swap', shared=True):
+        manifest = _read_manifest(file_path, store_dir)
+        df = _read_store(store_dir, manifest, month, day, start_date, end_date) if manifest else None
+    if df is not None:
+        return df
+
+    # The store could not be written or read; fall back to parsing the CSV
+    return read_csv_filtered(file_path, month, day, start_date=start_date, end_date=end_date)
+
+
+def main():
+    """Export the column stores of all city files found in a data directory."""
+    parser = argparse.ArgumentParser(description="Bikeshare column store management")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Export city CSVs to memory-mapped column stores")
+    export_parser.add_argument('--data-dir', type=Path, default=Path('.'),
+                               help="Directory containing the city CSV files")
+
+    ingest_parser = subparsers.add_parser('ingest', help="Append new trip exports to a city's column store")
+    ingest_parser.add_argument('city_file', type=Path, help="City CSV file the store was built from")
+    ingest_parser.add_argument('batch_files', type=Path, nargs='+', help="CSV files with the new trips")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'export':
+        for filename in CITY_SCHEMAS:
+            file_path = args.data_dir / filename
+            if not file_path.exists():
+                logger.warning(f"Skipping missing data file: {file_path}")
+                continue
+            store_dir = export_city(file_path)
+            logger.info(f"Exported {file_path} to {store_dir}")
+    elif args.command == 'ingest':
+        for batch_file in args.batch_files:
+            months = append_batch(args.city_file, batch_file)
+            logger.info(f"Appended {batch_file} to {args.city_file.name} (months: {months or 'none'})")
+
+        manifest = _read_manifest(args.city_file, store_path(args.city_file))
+        for month in sorted(manifest['monthly_aggregates'], key=int):
+            aggregates = manifest['monthly_aggregates'][month]
+            logger.info(f"Month {month:>2}: {aggregates['trips']:,} trips, "
+                        f"{aggregates['first_start']} - {aggregates['last_start']}")
+
+
+if __name__ == "__main__":
+    main()
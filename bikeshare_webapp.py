@@ -5,8 +5,10 @@ A comprehensive, visual web application for exploring bikeshare data with
 interactive charts, maps, and advanced analytics.
 
 Run with: streamlit run bikeshare_webapp.py
+(app options go after a ``--``, e.g. ``-- --route-counters 500000``)
 """
 
+import argparse
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -19,21 +21,19 @@ from datetime import datetime, timedelta
 import warnings
 from pathlib import Path
 import time
-from typing import Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
-# Configure page
-st.set_page_config(
-    page_title="🚴 Bikeshare Explorer",
-    page_icon="🚴",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+from bikeshare_cube import CubeSelection, TripCube
+from bikeshare_kernels import code_counts
+from bikeshare_results import ResultCache
+from bikeshare_storage import (DAY_NAMES, CityWarmUp, TimeBucketIndex, dataset_version,
+                               ensure_features, load_city_data, route_keys, time_range_rows)
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
 # Custom CSS for better styling
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -56,7 +56,23 @@ st.markdown("""
         box-shadow: 0 2px 4px rgba(0,0,0,0.1);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+def configure_page():
+    """
+    Configure the page and inject the custom CSS.
+    
+    Kept out of import time: the warm-up worker processes re-import this
+    module and must not issue Streamlit calls.
+    """
+    st.set_page_config(
+        page_title="🚴 Bikeshare Explorer",
+        page_icon="🚴",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 class BikeshareWebApp:
@@ -74,12 +90,45 @@ class BikeshareWebApp:
         'New York City': [40.7589, -73.9851],
         'Washington': [38.9072, -77.0369]
     }
+
+    MONTHS = ['All', 'January', 'February', 'March', 'April', 'May', 'June',
+              'July', 'August', 'September', 'October', 'November', 'December']
+
+    # Total (time cell, route) counters the trip cube keeps, set with
+    # --route-counters; None keeps every route, a number bounds memory on
+    # multi-year data and makes the route chart approximate (with its error
+    # shown)
+    ROUTE_COUNTERS: Optional[int] = None
+    
+    # Memory budget of the analysis results shared by all sessions
+    RESULT_CACHE_BYTES = 256 * 1024**2
+
+    # Derived features (see bikeshare_storage.DERIVED_FEATURES) the filters
+    # and views read; load_data derives them once, before the frame is shared
+    FEATURES = ['date_code', 'month', 'day_of_week', 'hour', 'is_weekend']
     
+    # Views of the main area and their section names; only the selected view
+    # is computed on a rerun
+    VIEWS = {
+        "⏰ Time Analysis": 'time',
+        "🚉 Stations & Routes": 'stations',
+        "👥 Demographics": 'demographics',
+        "📈 Advanced Analytics": 'advanced',
+        "🗺️ Map View": 'map',
+        "💾 Data Export": 'export',
+    }
+
     def __init__(self):
         """Initialize the web application."""
         self.df = None
+        self.warm_up = self.start_warm_up()
         self.init_session_state()
     
+    @st.cache_resource
+    def start_warm_up(_self) -> CityWarmUp:
+        """Parse all cities in parallel worker processes, once per server process."""
+        return CityWarmUp({city: Path(filename) for city, filename in _self.CITY_DATA.items()})
+    
     def init_session_state(self):
         """Initialize session state variables."""
         if 'data_loaded' not in st.session_state:
@@ -87,62 +136,124 @@ class BikeshareWebApp:
         if 'df' not in st.session_state:
             st.session_state.df = None
     
-    @st.cache_data
-    def load_data(_self, city: str) -> pd.DataFrame:
-        """Load and preprocess data with caching."""
+    def get_city_data(self, city: str) -> pd.DataFrame:
+        """Return the cached frame of a city, reloading it after new trips are ingested."""
+        return self.load_data(city, dataset_version(Path(self.CITY_DATA[city])))
+    
+    # Old versions of a city are evicted rather than kept until restart
+    @st.cache_resource(max_entries=6)
+    def load_data(_self, city: str, version: str = '') -> pd.DataFrame:
+        """
+        Load and preprocess data with caching.
+        
+        The frame is backed by read-only memory maps of the city's column store
+        and shared by all sessions (cache_resource hands out the same object
+        instead of a pickled copy per session), so it must not be modified in
+        place: every derived feature a section reads is added here, before
+        any session can see the frame, and readers never insert columns.
+        `version` only keys the cache: it changes when the source file
+        changes or new batches are appended to the store.
+        """
         try:
             file_path = Path(_self.CITY_DATA[city])
+            
+            # If the startup warm-up is still parsing this city, wait for it
+            # instead of parsing the CSV a second time
+            _self.start_warm_up().wait(city)
+            
             if not file_path.exists():
                 st.error(f"Data file not found: {file_path}")
                 return pd.DataFrame()
             
-            # Load data
-            df = pd.read_csv(file_path)
-            
-            # Preprocess
-            df['Start Time'] = pd.to_datetime(df['Start Time'], errors='coerce')
-            df = df.dropna(subset=['Start Time'])
-            
-            # Create additional features
-            df['month'] = df['Start Time'].dt.month
-            df['day_of_week'] = df['Start Time'].dt.day_name()
-            df['hour'] = df['Start Time'].dt.hour
-            df['date'] = df['Start Time'].dt.date
-            df['is_weekend'] = df['day_of_week'].isin(['Saturday', 'Sunday'])
-            
-            # Create route column
-            if 'Start Station' in df.columns and 'End Station' in df.columns:
-                df['route'] = df['Start Station'] + ' → ' + df['End Station']
-            
-            return df
+            # Map the preprocessed city columns (exported to the column store on
+            # first use) and derive the remaining features while the frame is
+            # still private to this call
+            df = load_city_data(file_path)
+            return ensure_features(df, _self.FEATURES)
             
         except Exception as e:
             st.error(f"Error loading data: {e}")
             return pd.DataFrame()
     
+    def get_bucket_index(self, city: str) -> TimeBucketIndex:
+        """Return the bucket index of a city's cached frame."""
+        return self.load_bucket_index(city, dataset_version(Path(self.CITY_DATA[city])))
+    
+    @st.cache_resource(max_entries=6)
+    def load_bucket_index(_self, city: str, version: str = '') -> TimeBucketIndex:
+        """Bucket the cached city frame by (month, weekday, hour), once per data version."""
+        return TimeBucketIndex(_self.load_data(city, version))
+    
+    def get_cube(self, city: str) -> TripCube:
+        """Return the trip cube of a city's cached frame."""
+        return self.load_cube(city, dataset_version(Path(self.CITY_DATA[city])), self.ROUTE_COUNTERS)
+    
+    @st.cache_resource(max_entries=6)
+    def load_cube(_self, city: str, version: str = '', route_counters: Optional[int] = None) -> TripCube:
+        """Pre-aggregate the cached city frame per (month, weekday, hour), once per data version."""
+        return TripCube(_self.load_data(city, version), route_counters)
+    
+    @st.cache_resource
+    def get_result_cache(_self) -> ResultCache:
+        """Return the LRU cache of analysis results, shared by all sessions."""
+        return ResultCache(_self.RESULT_CACHE_BYTES)
+    
+    def result_key(self, city: str, *filters) -> Tuple:
+        """Key a result by city, the city's current data version and the filters it depends on."""
+        return (city, dataset_version(Path(self.CITY_DATA[city]))) + filters
+    
+    def cached_result(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        """Return a memoized result, computing it only the first time its key is seen."""
+        return self.get_result_cache().get_or_compute(key, compute)
+    
+    def time_filters(self, month_filter: str, day_filter: str, hour_range: Tuple[int, int]) -> Tuple:
+        """Translate the sidebar filters into month, weekday and hour selections (None for all)."""
+        months = None if month_filter == 'All' else [self.MONTHS.index(month_filter)]
+        days = None if day_filter == 'All' else [DAY_NAMES.index(day_filter)]
+        hours = None if tuple(hour_range) == (0, 23) else range(hour_range[0], hour_range[1] + 1)
+        return months, days, hours
+    
+    def date_range_rows(self, df: pd.DataFrame, date_range: Tuple) -> slice:
+        """Return the rows of a custom date range (all rows without one)."""
+        # The cached frame is sorted by Start Time: a custom date range is two
+        # binary searches
+        if len(date_range) == 2:
+            return time_range_rows(df, date_range[0], date_range[1] + timedelta(days=1))
+        return slice(None)
+    
+    def select_summary(self, city: str, df: pd.DataFrame, month_filter: str, day_filter: str,
+                       hour_range: Tuple[int, int], date_range: Tuple = ()) -> CubeSelection:
+        """
+        Answer the sidebar filters from a pre-aggregated trip cube.
+        
+        Month, day and hour filters select cells of the city's shared cube; a
+        custom date range aggregates just the rows in range instead (once per
+        range, via the result cache).
+        """
+        if len(date_range) == 2:
+            cube = self.cached_result(
+                self.result_key(city, 'cube', tuple(date_range)),
+                lambda: TripCube(df.iloc[self.date_range_rows(df, date_range)], self.ROUTE_COUNTERS))
+        else:
+            cube = self.get_cube(city)
+        return cube.select(*self.time_filters(month_filter, day_filter, hour_range))
+    
     def filter_data(self, df: pd.DataFrame, month_filter: str, day_filter: str, 
-                   hour_range: Tuple[int, int]) -> pd.DataFrame:
+                   hour_range: Tuple[int, int], date_range: Tuple = (),
+                   index: Optional[TimeBucketIndex] = None) -> pd.DataFrame:
         """Apply filters to the data."""
-        filtered_df = df.copy()
-        
-        # Month filter
-        if month_filter != 'All':
-            month_num = ['All', 'January', 'February', 'March', 'April', 'May', 'June'].index(month_filter)
-            filtered_df = filtered_df[filtered_df['month'] == month_num]
-        
-        # Day filter
-        if day_filter != 'All':
-            filtered_df = filtered_df[filtered_df['day_of_week'] == day_filter]
-        
-        # Hour range filter
-        filtered_df = filtered_df[
-            (filtered_df['hour'] >= hour_range[0]) & 
-            (filtered_df['hour'] <= hour_range[1])
-        ]
-        
-        return filtered_df
+        rows = self.date_range_rows(df, date_range)
+        months, days, hours = self.time_filters(month_filter, day_filter, hour_range)
+        if months is None and days is None and hours is None:
+            return df.iloc[rows]
+        
+        # Month, day and hour resolve to a union of precomputed buckets
+        # instead of comparing every row on each sidebar change
+        if index is None:
+            index = TimeBucketIndex(df)
+        return df.take(index.select(months, days, hours, rows))
     
-    def create_sidebar(self) -> Tuple[str, str, str, Tuple[int, int]]:
+    def create_sidebar(self) -> Tuple[str, str, str, Tuple[int, int], Tuple]:
         """Create sidebar with filters and controls."""
         st.sidebar.markdown("# 🎛️ Control Panel")
         
@@ -156,7 +267,7 @@ class BikeshareWebApp:
         # Month filter
         month = st.sidebar.selectbox(
             "📅 Filter by Month",
-            options=['All', 'January', 'February', 'March', 'April', 'May', 'June'],
+            options=self.MONTHS,
             help="Filter data by specific month"
         )
         
@@ -176,15 +287,35 @@ class BikeshareWebApp:
             help="Filter data by hour of the day"
         )
         
+        # Custom date range (empty or half-selected means no date filter)
+        date_range = st.sidebar.date_input(
+            "🗓️ Custom Date Range",
+            value=(),
+            help="Optionally restrict the analysis to a start and end date"
+        )
+        
         # Additional controls
         st.sidebar.markdown("---")
         st.sidebar.markdown("### 📊 Display Options")
         
-        return city, month, day, hour_range
+        self.display_warm_up_status()
+        
+        return city, month, day, hour_range, date_range
+    
+    def display_warm_up_status(self):
+        """Report which cities are warm, mapping finished ones into the shared cache."""
+        st.sidebar.markdown("---")
+        st.sidebar.markdown("### 🔥 City Data Cache")
+        
+        icons = {'warm': '✅', 'warming': '⏳', 'failed': '❌', 'missing': '⚠️'}
+        for city, state in self.warm_up.status().items():
+            if state == 'warm':
+                self.get_city_data(city)  # Only maps the exported store, so this is instant
+            st.sidebar.caption(f"{icons[state]} {city}: {state}")
     
-    def display_overview_metrics(self, df: pd.DataFrame):
+    def display_overview_metrics(self, summary: CubeSelection):
         """Display key metrics in an attractive layout."""
-        if df.empty:
+        if summary.trips == 0:
             return
         
         st.markdown("## 📊 Quick Overview")
@@ -192,23 +323,25 @@ class BikeshareWebApp:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
+            first_day, last_day = summary.date_span()
             st.metric(
                 label="🚴 Total Trips",
-                value=f"{len(df):,}",
-                delta=f"Data from {df['Start Time'].min().date()} to {df['Start Time'].max().date()}"
+                value=f"{summary.trips:,}",
+                delta=f"Data from {first_day.date()} to {last_day.date()}"
             )
         
         with col2:
-            if 'Trip Duration' in df.columns:
-                avg_duration = df['Trip Duration'].mean() / 60  # Convert to minutes
+            durations = summary.duration_stats()
+            if durations is not None:
+                avg_duration, min_duration, max_duration = (d / 60 for d in durations)  # Convert to minutes
                 st.metric(
                     label="⏱️ Avg Trip Duration",
                     value=f"{avg_duration:.1f} min",
-                    delta=f"Range: {df['Trip Duration'].min()/60:.1f} - {df['Trip Duration'].max()/60:.1f} min"
+                    delta=f"Range: {min_duration:.1f} - {max_duration:.1f} min"
                 )
         
         with col3:
-            unique_stations = df['Start Station'].nunique() if 'Start Station' in df.columns else 0
+            unique_stations = len(summary.counts('Start Station')) if summary.has('Start Station') else 0
             st.metric(
                 label="🚉 Unique Stations",
                 value=f"{unique_stations:,}",
@@ -216,26 +349,30 @@ class BikeshareWebApp:
             )
         
         with col4:
-            if 'User Type' in df.columns:
-                subscriber_pct = (df['User Type'] == 'Subscriber').mean() * 100
+            if summary.has('User Type'):
+                subscriber_pct = summary.counts('User Type').get('Subscriber', 0) / summary.trips * 100
                 st.metric(
                     label="👥 Subscriber Rate",
                     value=f"{subscriber_pct:.1f}%",
                     delta="of all users"
                 )
     
-    def create_time_analysis_charts(self, df: pd.DataFrame):
+    def create_time_analysis_charts(self, summary: CubeSelection):
         """Create comprehensive time-based analysis charts."""
-        if df.empty:
+        if summary.trips == 0:
             return
         
         st.markdown("## ⏰ Time Pattern Analysis")
         
+        # Hour x weekday counts from the cube; both bar charts are its margins
+        pivot_data = summary.hour_day_counts()
+        
         # Hourly distribution
         col1, col2 = st.columns(2)
         
         with col1:
-            hourly_data = df.groupby('hour').size().reset_index(name='trips')
+            hourly_data = pivot_data.sum(axis=1)
+            hourly_data = hourly_data[hourly_data > 0].reset_index(name='trips')
             fig_hourly = px.bar(
                 hourly_data, 
                 x='hour', 
@@ -249,11 +386,10 @@ class BikeshareWebApp:
             st.plotly_chart(fig_hourly, use_container_width=True)
         
         with col2:
-            daily_data = df.groupby('day_of_week').size().reset_index(name='trips')
-            # Reorder days
-            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            daily_data['day_of_week'] = pd.Categorical(daily_data['day_of_week'], categories=day_order, ordered=True)
-            daily_data = daily_data.sort_values('day_of_week')
+            daily_data = pd.DataFrame({
+                'day_of_week': DAY_NAMES,
+                'trips': pivot_data.sum(axis=0).to_numpy(),
+            })
             
             fig_daily = px.bar(
                 daily_data,
@@ -267,19 +403,9 @@ class BikeshareWebApp:
             fig_daily.update_layout(showlegend=False)
             st.plotly_chart(fig_daily, use_container_width=True)
         
-        # Heatmap of hour vs day
-        if len(df) > 0:
-            pivot_data = df.pivot_table(
-                values='Start Time',
-                index='hour',
-                columns='day_of_week',
-                aggfunc='count',
-                fill_value=0
-            )
-            
-            # Reorder columns
-            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            pivot_data = pivot_data.reindex(columns=day_order)
+        # Heatmap of hour vs day (hours without trips are left out, as before)
+        if summary.trips > 0:
+            pivot_data = pivot_data[pivot_data.sum(axis=1) > 0]
             
             fig_heatmap = px.imshow(
                 pivot_data,
@@ -289,9 +415,9 @@ class BikeshareWebApp:
             )
             st.plotly_chart(fig_heatmap, use_container_width=True)
     
-    def create_station_analysis(self, df: pd.DataFrame):
+    def create_station_analysis(self, summary: CubeSelection):
         """Create station popularity and route analysis."""
-        if df.empty or 'Start Station' not in df.columns:
+        if summary.trips == 0 or not summary.has('Start Station'):
             return
         
         st.markdown("## 🚉 Station & Route Analysis")
@@ -300,7 +426,7 @@ class BikeshareWebApp:
         
         with col1:
             # Top start stations
-            top_start = df['Start Station'].value_counts().head(10).reset_index()
+            top_start = summary.counts('Start Station', k=10).reset_index()
             top_start.columns = ['Station', 'Trips']
             
             fig_start = px.bar(
@@ -318,8 +444,8 @@ class BikeshareWebApp:
         
         with col2:
             # Top end stations
-            if 'End Station' in df.columns:
-                top_end = df['End Station'].value_counts().head(10).reset_index()
+            if summary.has('End Station'):
+                top_end = summary.counts('End Station', k=10).reset_index()
                 top_end.columns = ['Station', 'Trips']
                 
                 fig_end = px.bar(
@@ -336,12 +462,13 @@ class BikeshareWebApp:
                 st.plotly_chart(fig_end, use_container_width=True)
         
         # Top routes
-        if 'route' in df.columns:
-            top_routes = df['route'].value_counts().head(10).reset_index()
-            top_routes.columns = ['Route', 'Trips']
+        if summary.cube.has_routes:
+            # Ranked from per-cell route counts; only the top 10 get string labels
+            routes = summary.top_routes(k=10).reset_index()
+            routes.columns = ['Route', 'Trips']
             
             fig_routes = px.bar(
-                top_routes,
+                routes,
                 x='Trips',
                 y='Route',
                 orientation='h',
@@ -352,10 +479,12 @@ class BikeshareWebApp:
             )
             fig_routes.update_layout(yaxis={'categoryorder':'total ascending'})
             st.plotly_chart(fig_routes, use_container_width=True)
+            if summary.route_error:
+                st.caption(f"ℹ️ Approximate: each route may be missing up to {summary.route_error:,} trips")
     
-    def create_user_demographics_analysis(self, df: pd.DataFrame):
+    def create_user_demographics_analysis(self, summary: CubeSelection):
         """Create user demographics visualizations."""
-        if df.empty:
+        if summary.trips == 0:
             return
         
         st.markdown("## 👥 User Demographics")
@@ -363,9 +492,9 @@ class BikeshareWebApp:
         col1, col2, col3 = st.columns(3)
         
         # User Type Distribution
-        if 'User Type' in df.columns:
+        if summary.has('User Type'):
             with col1:
-                user_type_data = df['User Type'].value_counts().reset_index()
+                user_type_data = summary.counts('User Type').reset_index()
                 user_type_data.columns = ['User Type', 'Count']
                 
                 fig_user_type = px.pie(
@@ -378,9 +507,9 @@ class BikeshareWebApp:
                 st.plotly_chart(fig_user_type, use_container_width=True)
         
         # Gender Distribution
-        if 'Gender' in df.columns:
+        if summary.has('Gender'):
             with col2:
-                gender_data = df['Gender'].value_counts().reset_index()
+                gender_data = summary.counts('Gender').reset_index()
                 gender_data.columns = ['Gender', 'Count']
                 
                 fig_gender = px.pie(
@@ -393,50 +522,84 @@ class BikeshareWebApp:
                 st.plotly_chart(fig_gender, use_container_width=True)
         
         # Age Distribution
-        if 'Birth Year' in df.columns:
+        if summary.has('Birth Year'):
             with col3:
-                birth_years = df['Birth Year'].dropna()
+                birth_years = summary.counts('Birth Year')
                 if not birth_years.empty:
                     current_year = datetime.now().year
-                    ages = current_year - birth_years
+                    ages = current_year - birth_years.index.to_numpy(dtype=np.int64)
                     
-                    fig_age = px.histogram(
-                        x=ages,
-                        nbins=30,
+                    # Binned from the trips per birth year, never per trip
+                    fig_age = self.histogram_chart(
+                        *np.histogram(ages, bins=30, weights=birth_years.to_numpy()),
                         title="🎂 Age Distribution",
-                        labels={'x': 'Age', 'y': 'Count'},
-                        color_discrete_sequence=['#ff6b6b']
+                        x_label='Age',
+                        y_label='Count',
+                        color='#ff6b6b'
                     )
                     st.plotly_chart(fig_age, use_container_width=True)
     
-    def create_advanced_analytics(self, df: pd.DataFrame):
-        """Create advanced analytics and insights."""
-        if df.empty:
+    @staticmethod
+    def histogram_chart(counts: np.ndarray, edges: np.ndarray, title: str, x_label: str, y_label: str,
+                        color: Optional[str] = None) -> go.Figure:
+        """
+        Draw server-side histogram bins (as returned by np.histogram) as bars.
+        
+        Only the bars are sent to the browser, so the page payload and render
+        time do not grow with the number of filtered trips.
+        """
+        fig = go.Figure(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            width=np.diff(edges),
+            customdata=np.column_stack([edges[:-1], edges[1:]]),
+            hovertemplate=f"{x_label}: %{{customdata[0]:.0f}}-%{{customdata[1]:.0f}}<br>{y_label}: %{{y:,}}<extra></extra>",
+            marker_color=color
+        ))
+        fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, bargap=0)
+        return fig
+    
+    def advanced_results(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Aggregate the filtered trips for the advanced analytics section."""
+        results = {
+            'weekend_counts': code_counts(df['is_weekend'].to_numpy(), minlength=2),
+            'month_counts': code_counts(df['month'].to_numpy(), minlength=13),
+        }
+        if 'Trip Duration' in df.columns:
+            durations = df['Trip Duration'].to_numpy(dtype=np.float64, na_value=np.nan)
+            results['duration_bins'] = np.histogram(durations[~np.isnan(durations)], bins=50)
+            results['hourly_duration'] = df.groupby('hour')['Trip Duration'].mean().reset_index()
+        return results
+    
+    def create_advanced_analytics(self, results: Dict[str, Any], summary: CubeSelection):
+        """Create advanced analytics and insights from advanced_results()."""
+        if summary.trips == 0:
             return
         
         st.markdown("## 📈 Advanced Analytics")
         
         # Trip duration analysis
-        if 'Trip Duration' in df.columns:
+        if 'duration_bins' in results:
             col1, col2 = st.columns(2)
             
             with col1:
                 # Trip duration distribution
-                fig_duration = px.histogram(
-                    df,
-                    x='Trip Duration',
-                    nbins=50,
+                fig_duration = self.histogram_chart(
+                    *results['duration_bins'],
                     title="⏱️ Trip Duration Distribution",
-                    labels={'Trip Duration': 'Duration (seconds)', 'count': 'Number of Trips'}
-                )
-                fig_duration.update_layout(
-                    xaxis=dict(range=[0, df['Trip Duration'].quantile(0.95)])  # Remove outliers for better view
+                    x_label='Duration (seconds)',
+                    y_label='Number of Trips'
                 )
+                # Remove outliers for better view; the 95th percentile comes from
+                # the cube's quantile samples instead of sorting the durations
+                clip = summary.duration_quantiles([0.95])
+                if clip is not None:
+                    fig_duration.update_layout(xaxis=dict(range=[0, clip[0]]))
                 st.plotly_chart(fig_duration, use_container_width=True)
             
             with col2:
                 # Average trip duration by hour
-                hourly_duration = df.groupby('hour')['Trip Duration'].mean().reset_index()
+                hourly_duration = results['hourly_duration'].copy()
                 hourly_duration['Trip Duration (min)'] = hourly_duration['Trip Duration'] / 60
                 
                 fig_hourly_duration = px.line(
@@ -450,8 +613,9 @@ class BikeshareWebApp:
                 st.plotly_chart(fig_hourly_duration, use_container_width=True)
         
         # Weekend vs Weekday comparison
-        weekend_comparison = df.groupby('is_weekend').size().reset_index(name='trips')
-        weekend_comparison['Day Type'] = weekend_comparison['is_weekend'].map({True: 'Weekend', False: 'Weekday'})
+        weekend_counts = results['weekend_counts']
+        weekend_comparison = pd.DataFrame({'Day Type': ['Weekday', 'Weekend'], 'trips': weekend_counts})
+        weekend_comparison = weekend_comparison[weekend_comparison['trips'] > 0]
         
         col1, col2 = st.columns(2)
         
@@ -469,8 +633,10 @@ class BikeshareWebApp:
         
         with col2:
             # Monthly trend (if data spans multiple months)
-            if df['month'].nunique() > 1:
-                monthly_data = df.groupby('month').size().reset_index(name='trips')
+            month_counts = results['month_counts']
+            if np.count_nonzero(month_counts) > 1:
+                months = np.flatnonzero(month_counts)
+                monthly_data = pd.DataFrame({'month': months, 'trips': month_counts[months]})
                 month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
                 monthly_data['Month'] = monthly_data['month'].map(lambda x: month_names[x] if x < len(month_names) else str(x))
                 
@@ -484,7 +650,7 @@ class BikeshareWebApp:
                 )
                 st.plotly_chart(fig_monthly, use_container_width=True)
     
-    def create_city_map(self, city: str, df: pd.DataFrame):
+    def create_city_map(self, city: str):
         """Create an interactive map for the selected city."""
         st.markdown("## 🗺️ Interactive City Map")
         
@@ -510,9 +676,36 @@ class BikeshareWebApp:
         # Display map
         folium_static(m, width=700, height=500)
     
-    def create_download_section(self, df: pd.DataFrame):
-        """Create download section for filtered data."""
-        if df.empty:
+    def export_results(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Render the filtered trips and their summary statistics as CSV."""
+        # Weekdays are stored as codes (0 = Monday); export them as day names
+        df = df.assign(day_of_week=np.asarray(DAY_NAMES)[df['day_of_week'].to_numpy(np.int64)])
+        # The date and route columns are only needed here, so they are built
+        # for the exported rows instead of being kept on the shared frame
+        df.insert(df.columns.get_loc('is_weekend'), 'date',
+                  df['date_code'].to_numpy().astype('datetime64[D]'))
+        df = df.drop(columns='date_code')
+        df['route'] = self.route_labels(df)
+        return {
+            'csv': df.to_csv(index=False),
+            'summary_csv': df.describe().to_csv(),
+            'rows': len(df),
+        }
+    
+    @staticmethod
+    def route_labels(df: pd.DataFrame) -> pd.Categorical:
+        """Label every trip's route 'Start → End', decoding each distinct route once."""
+        stations = df['Start Station'].cat.categories
+        route_ids, codes = np.unique(route_keys(df), return_inverse=True)
+        known = route_ids >= 0
+        labels = [f"{stations[key // len(stations)]} → {stations[key % len(stations)]}"
+                  for key in route_ids[known]]
+        # Trips with a missing station (key -1, sorted first) get a missing label
+        return pd.Categorical.from_codes(codes - (~known).sum(), labels)
+    
+    def create_download_section(self, results: Dict[str, Any]):
+        """Create download section for filtered data from export_results()."""
+        if results['rows'] == 0:
             return
         
         st.markdown("## 💾 Download Data")
@@ -521,26 +714,24 @@ class BikeshareWebApp:
         
         with col1:
             # Download filtered data as CSV
-            csv = df.to_csv(index=False)
             st.download_button(
                 label="📄 Download as CSV",
-                data=csv,
+                data=results['csv'],
                 file_name=f"bikeshare_filtered_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
         
         with col2:
             # Download summary statistics
-            summary_stats = df.describe().to_csv()
             st.download_button(
                 label="📊 Download Summary Stats",
-                data=summary_stats,
+                data=results['summary_csv'],
                 file_name=f"bikeshare_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
         
         with col3:
-            st.info(f"💡 Total filtered records: {len(df):,}")
+            st.info(f"💡 Total filtered records: {results['rows']:,}")
     
     def run(self):
         """Run the main application."""
@@ -549,56 +740,58 @@ class BikeshareWebApp:
         st.markdown("### Explore bikeshare patterns with interactive visualizations and advanced analytics")
         
         # Sidebar controls
-        city, month, day, hour_range = self.create_sidebar()
+        city, month, day, hour_range, date_range = self.create_sidebar()
         
         # Load data
         with st.spinner(f"Loading data for {city}..."):
-            df = self.load_data(city)
+            df = self.get_city_data(city)
         
         if df.empty:
             st.error("❌ No data available. Please ensure the data files are in the correct location.")
             return
         
-        # Apply filters
-        filtered_df = self.filter_data(df, month, day, hour_range)
+        # The overview, time, station and demographic sections only need
+        # counts, which the cube answers without touching the trips
+        summary = self.select_summary(city, df, month, day, hour_range, date_range)
         
-        if filtered_df.empty:
+        if summary.trips == 0:
             st.warning("⚠️ No data matches the selected filters. Please adjust your criteria.")
             return
         
         # Display filter summary
-        st.success(f"✅ Loaded {len(filtered_df):,} trips from {city} (filtered from {len(df):,} total)")
+        st.success(f"✅ Loaded {summary.trips:,} trips from {city} (filtered from {len(df):,} total)")
         
-        # Main content
-        self.display_overview_metrics(filtered_df)
-        
-        # Create tabs for different analyses
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-            "⏰ Time Analysis", 
-            "🚉 Stations & Routes", 
-            "👥 Demographics", 
-            "📈 Advanced Analytics", 
-            "🗺️ Map View",
-            "💾 Data Export"
-        ])
-        
-        with tab1:
-            self.create_time_analysis_charts(filtered_df)
-        
-        with tab2:
-            self.create_station_analysis(filtered_df)
+        # Results that need the filtered trips are memoized per data version
+        # and filters; the trips are only filtered when the result is missing
+        key = self.result_key(city, month, day, tuple(hour_range), tuple(date_range))
         
-        with tab3:
-            self.create_user_demographics_analysis(filtered_df)
+        def filtered_trips() -> pd.DataFrame:
+            return self.filter_data(df, month, day, hour_range, date_range, self.get_bucket_index(city))
         
-        with tab4:
-            self.create_advanced_analytics(filtered_df)
-        
-        with tab5:
-            self.create_city_map(city, filtered_df)
-        
-        with tab6:
-            self.create_download_section(filtered_df)
+        # Main content
+        self.display_overview_metrics(summary)
+        
+        # A view selector instead of tabs: Streamlit runs every tab's block on
+        # each rerun, even hidden ones, so a sidebar change would recompute
+        # all six analyses
+        view = st.radio("📊 View", options=list(self.VIEWS), horizontal=True, key='view',
+                        label_visibility='collapsed')
+        section = self.VIEWS[view]
+        
+        if section == 'time':
+            self.create_time_analysis_charts(summary)
+        elif section == 'stations':
+            self.create_station_analysis(summary)
+        elif section == 'demographics':
+            self.create_user_demographics_analysis(summary)
+        elif section == 'advanced':
+            self.create_advanced_analytics(self.cached_result(
+                key + ('advanced',), lambda: self.advanced_results(filtered_trips())), summary)
+        elif section == 'map':
+            self.create_city_map(city)
+        elif section == 'export':
+            self.create_download_section(self.cached_result(
+                key + ('export',), lambda: self.export_results(filtered_trips())))
         
         # Footer
         st.markdown("---")
@@ -618,6 +811,15 @@ class BikeshareWebApp:
 
 def main():
     """Main function to run the web application."""
+    parser = argparse.ArgumentParser(description="Interactive Bikeshare Data Explorer")
+    parser.add_argument('--route-counters', type=int,
+                        help="Keep at most this many (time cell, route) counters in each trip cube "
+                             "(16 bytes each; approximate route counts) instead of every route")
+    # Streamlit passes the arguments after `--`; ignore anything else on the command line
+    args, _ = parser.parse_known_args()
+    BikeshareWebApp.ROUTE_COUNTERS = args.route_counters
+    
+    configure_page()
     app = BikeshareWebApp()
     app.run()
 
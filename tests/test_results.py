@@ -0,0 +1,56 @@
+"""LRU order and byte accounting of bikeshare_results.ResultCache."""
+
+import numpy as np
+
+from bikeshare_results import ResultCache, result_nbytes
+
+
+def _result(n_bytes: int) -> np.ndarray:
+    return np.zeros(n_bytes // 8, dtype=np.float64)
+
+
+def test_evicts_least_recently_used_first():
+    cache = ResultCache(max_bytes=3_000)
+    for key in 'abc':
+        cache.put(key, _result(1_000))
+    assert cache.get('a') is not None  # 'b' is now the least recently used
+
+    cache.put('d', _result(1_000))
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert len(cache) == 3
+    assert cache.nbytes == 3_000
+
+
+def test_byte_accounting_on_replace_and_clear():
+    cache = ResultCache(max_bytes=10_000)
+    cache.put('a', _result(1_000))
+    cache.put('a', _result(4_000))
+    cache.put('b', {'counts': _result(2_000), 'label': 'b'})
+    assert cache.nbytes == 4_000 + result_nbytes({'counts': _result(2_000), 'label': 'b'})
+
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_result_larger_than_budget_is_not_stored():
+    cache = ResultCache(max_bytes=1_000)
+    cache.put('small', _result(800))
+    cache.put('large', _result(2_000))
+    assert cache.get('large') is None
+    assert cache.get('small') is not None
+    assert cache.nbytes == 800
+
+
+def test_get_or_compute_computes_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _result(80)
+
+    first = cache.get_or_compute('key', compute)
+    assert cache.get_or_compute('key', compute) is first
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,49 @@
+"""Error bounds of the mergeable summaries in bikeshare_sketches."""
+
+import numpy as np
+import pandas as pd
+
+from bikeshare_sketches import HeavyHitters, QuantileSketch
+
+
+def test_quantile_sketch_rank_error_after_merge():
+    rng = np.random.default_rng(0)
+    chunks = [rng.lognormal(6, 1, size=20_000) for _ in range(5)]
+
+    sketch = QuantileSketch(seed=1)
+    for seed, chunk in enumerate(chunks, start=2):
+        sketch.merge(QuantileSketch(seed=seed).update(chunk))
+
+    values = np.sort(np.concatenate(chunks))
+    assert sketch.n == len(values)
+    assert not sketch.is_exact
+    for quantile in [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]:
+        rank = np.searchsorted(values, sketch.quantile(quantile)) / len(values)
+        assert abs(rank - quantile) <= sketch.rank_error
+
+
+def test_quantile_sketch_is_exact_before_compaction():
+    values = np.arange(100, dtype=np.float64)
+    sketch = QuantileSketch().update(values[:50]).merge(QuantileSketch().update(values[50:]))
+    assert sketch.is_exact and sketch.rank_error == 0.0
+    assert sketch.quantile(0.5) == np.quantile(values, 0.5, method='inverted_cdf')
+
+
+def test_heavy_hitters_overestimate_within_floor():
+    rng = np.random.default_rng(0)
+    chunks = [pd.Series(rng.zipf(1.3, size=10_000) % 5_000) for _ in range(8)]
+    truth = pd.concat(chunks).value_counts()
+
+    # Half the chunks go through a second summary that is merged in
+    left, right = HeavyHitters(capacity=200), HeavyHitters(capacity=200)
+    for i, chunk in enumerate(chunks):
+        (left if i % 2 else right).update(chunk.value_counts())
+    hitters = left.merge(right)
+
+    assert hitters.floor > 0
+    assert len(hitters.counts) <= hitters.capacity
+    true_counts = truth.reindex(hitters.counts.index, fill_value=0)
+    assert (hitters.counts >= true_counts).all()
+    assert (hitters.counts - true_counts <= hitters.floor).all()
+    # Every key occurring more often than the floor is kept
+    assert set(truth[truth > hitters.floor].index) <= set(hitters.counts.index)
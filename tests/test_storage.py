@@ -0,0 +1,72 @@
+"""Column store round trips in bikeshare_storage."""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from bikeshare_storage import (COL_START_STATION, DICTIONARY_FILE, MANIFEST_FILE, STATION_DICTIONARY, append_batch,
+                               export_city, load_city_data, store_path)
+
+
+def _trips(start: str, freq: str, n: int, stations: list, seed: int) -> pd.DataFrame:
+    """Return n raw chicago-style trips, `freq` apart from `start`."""
+    rng = np.random.default_rng(seed)
+    start_times = pd.date_range(start, periods=n, freq=freq)
+    durations = rng.integers(60, 3_600, size=n)
+    return pd.DataFrame({
+        'Start Time': start_times.strftime('%Y-%m-%d %H:%M:%S'),
+        'End Time': (start_times + pd.to_timedelta(durations, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'Trip Duration': durations,
+        'Start Station': rng.choice(stations, size=n),
+        'End Station': rng.choice(stations, size=n),
+        'User Type': rng.choice(['Subscriber', 'Customer'], size=n),
+        'Gender': rng.choice(['Male', 'Female', ''], size=n),
+        'Birth Year': rng.choice([1960.0, 1985.0, np.nan], size=n),
+    })
+
+
+def _code_dtype(store_dir, column: str) -> np.dtype:
+    with open(store_dir / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        spec = json.load(f)['columns'][column]
+    return np.load(store_dir / spec['file'], mmap_mode='r').dtype
+
+
+def _decoded(df: pd.DataFrame) -> pd.DataFrame:
+    """Compare categoricals by value: dictionaries differ in code order."""
+    return df.astype({name: object for name in df.columns if isinstance(df[name].dtype, pd.CategoricalDtype)})
+
+
+def test_ingest_matches_full_export(tmp_path):
+    # 100 stations fit int8 codes; the batch's new stations widen them to int16
+    old_stations = [f"Station {i}" for i in range(100)]
+    new_stations = [f"New Station {i}" for i in range(60)]
+    base = _trips('2017-03-01', '30min', 3_000, old_stations, seed=0)
+    # The batch interleaves with the stored trips as well as extending them
+    batch = _trips('2017-03-02 00:00:30', '37min', 3_000, old_stations + new_stations, seed=1)
+
+    (tmp_path / 'ingest').mkdir()
+    (tmp_path / 'full').mkdir()
+    city_file = tmp_path / 'ingest' / 'chicago.csv'
+    batch_file = tmp_path / 'ingest' / 'chicago_batch.csv'
+    full_file = tmp_path / 'full' / 'chicago.csv'
+    base.to_csv(city_file)
+    batch.to_csv(batch_file)
+    pd.concat([base, batch], ignore_index=True).to_csv(full_file)
+
+    export_city(city_file)
+    assert _code_dtype(store_path(city_file), COL_START_STATION) == np.int8
+    assert append_batch(city_file, batch_file) == [3, 4, 5]
+    assert _code_dtype(store_path(city_file), COL_START_STATION) == np.int16
+    with open(store_path(city_file) / DICTIONARY_FILE, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)[STATION_DICTIONARY]) == 160
+
+    export_city(full_file)
+    ingested = load_city_data(city_file)
+    exported = load_city_data(full_file)
+    assert len(ingested) == len(base) + len(batch)
+    pd.testing.assert_frame_equal(_decoded(ingested), _decoded(exported))
+
+    # Filters push down the same way on the merged store
+    pd.testing.assert_frame_equal(_decoded(load_city_data(city_file, month=4, day='Monday')),
+                                  _decoded(load_city_data(full_file, month=4, day='Monday')))